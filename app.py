@@ -1,16 +1,65 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
-from datetime import datetime, timedelta
-import json
-import plotly.graph_objects as go
-import plotly.express as px
-import requests
-from plotly.subplots import make_subplots
+from datetime import datetime
+import os
 import time
+import functools
+
+from leek_diary import (
+    FIGURE_CACHE_SIZE,
+    FX_CACHE_TTL,
+    HISTORY_CACHE_DIR,
+    HISTORY_RANGES,
+    PORTFOLIO_LOG_PATH,
+    QUOTE_CACHE_MAX_SIZE,
+    QUOTE_CACHE_TTL,
+    RUN_LOG_EXPORT_NAME,
+    RUN_LOG_PATH_ENV,
+    EQUITY_CACHE_DIR,
+    COST_METHODS,
+    DEFAULT_COST_METHOD,
+    BackgroundRefresher,
+    EquityCurveStore,
+    FigureCache,
+    FxRates,
+    HistoryStore,
+    HistoryUnavailable,
+    PortfolioLog,
+    PortfolioWatcher,
+    PositionBook,
+    QuoteCache,
+    RunLog,
+    StockInfoResolver,
+    SymbolLookupError,
+    SymbolNotFound,
+    begin_run,
+    build_ledger,
+    collect,
+    create_distribution_chart,
+    create_equity_curve_chart,
+    create_price_history_chart,
+    create_profit_loss_chart,
+    end_run,
+    is_market_open,
+    frame_fingerprint,
+    get_current_prices,
+    load_closes,
+    load_symbol_directory,
+    load_stock_history,
+    refresh_symbol_directory,
+    to_yf_ticker,
+)
 
 st.set_page_config(page_title="我的韭菜日記", page_icon="📊", layout="wide", initial_sidebar_state="collapsed")
 
+# 記錄這次 rerun 各階段的時間、網路請求與快取命中率，頁面最後顯示在側邊欄的效能資訊
+begin_run('script')
+
+def get_run_log():
+    if 'run_log' not in st.session_state:
+        st.session_state.run_log = RunLog(path=os.environ.get(RUN_LOG_PATH_ENV))
+    return st.session_state.run_log
+
 st.markdown("""
 <style>
     @import url('https://fonts.googleapis.com/css2?family=SF+Pro+Display:wght@400;500;600&display=swap');
@@ -193,325 +242,285 @@ st.markdown("""
 if 'portfolio' not in st.session_state:
     st.session_state.portfolio = []
 
-def load_portfolio():
-    try:
-        with open('my_portfolio.json', 'r', encoding='utf-8') as f:
-            portfolio = json.load(f)
-            # 簡單驗證載入的數據結構
-            if all(isinstance(stock, dict) and 'Symbol' in stock and 'Name' in stock and 'Market' in stock and 'Transactions' in stock for stock in portfolio):
-                return portfolio
-            else:
-                st.warning('載入的投資組合格式不正確,使用空投資組合')
-                return []
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError:
-        st.warning('無法解析投資組合文件,使用空投資組合')
-        return []
+@st.cache_resource
+def get_portfolio_log(path=PORTFOLIO_LOG_PATH):
+    return PortfolioLog(path)
 
-def save_portfolio():
-    with open('my_portfolio.json', 'w', encoding='utf-8') as f:
-        json.dump(st.session_state.portfolio, f, ensure_ascii=False, indent=4)
+@st.cache_resource
+def get_portfolio_watcher():
+    return PortfolioWatcher(get_portfolio_log())
 
-st.session_state.portfolio = load_portfolio()
+def portfolio_cache_key():
+    return (get_portfolio_log().file_key(), get_portfolio_watcher().generation)
+
+def load_portfolio():
+    portfolio, warnings = get_portfolio_log().load()
+    for warning in warnings:
+        st.warning(str(warning))
+    return portfolio
+
+def refresh_portfolio():
+    """投資組合檔案有變動時才重新讀取，否則沿用這個 session 已載入的投資組合"""
+    if st.session_state.get('portfolio_key') == portfolio_cache_key():
+        return
+    st.session_state.portfolio = load_portfolio()
+    st.session_state.portfolio_key = portfolio_cache_key()
+    st.session_state.position_book_stale = True
+
+def write_portfolio_change(write):
+    """執行 write(log)；寫入前檔案若沒有被其他 session 修改過，寫入後直接記住新版本，下次 rerun 不必重新解析"""
+    was_current = st.session_state.get('portfolio_key') == portfolio_cache_key()
+    write(get_portfolio_log())
+    if was_current:
+        st.session_state.portfolio_key = portfolio_cache_key()
+
+refresh_portfolio()
+
+@st.cache_resource
+def get_quote_cache(ttl=QUOTE_CACHE_TTL, max_size=QUOTE_CACHE_MAX_SIZE):
+    return QuoteCache(get_current_prices, ttl=ttl, max_size=max_size)
 
 def get_current_price(symbol, market):
+    prices, _ = get_quote_cache().get_prices([(symbol, market)])
+    return prices.get(symbol)
+
+@st.cache_resource
+def get_fx_rates(base='USD', ttl=FX_CACHE_TTL):
+    return FxRates(base, ttl=ttl)
+
+def get_position_book():
+    if 'position_book' not in st.session_state:
+        st.session_state.position_book = PositionBook(st.session_state.get('cost_method', DEFAULT_COST_METHOD))
+    return st.session_state.position_book
+
+def read_portfolio_quotes(positions):
+    """從報價快取讀取快照，不會等待網路；報價由背景執行緒更新
+
+    回傳 (symbol → price, 最舊一筆報價的時間, 報價還在載入的 symbol, 無法取得報價的 symbol)。
+    """
+    stocks = list(zip(positions.index, positions['Market']))
+    refresher = get_background_refresher()
+    refresher.watch(stocks)
+    quotes = get_quote_cache().snapshot(stocks)
+
+    missing = [(symbol, market) for symbol, market in stocks if symbol not in quotes]
+    pending = [symbol for symbol, market in missing if (symbol, market) not in refresher.failed]
+    failed = [symbol for symbol, market in missing if (symbol, market) in refresher.failed]
+    prices = {symbol: price for symbol, (price, _) in quotes.items()}
+    oldest = min((fetched_at for _, fetched_at in quotes.values()), default=None)
+    return prices, oldest, pending, failed
+
+@st.cache_resource
+def get_figure_cache(max_size=FIGURE_CACHE_SIZE):
+    return FigureCache(max_size)
+
+def cached_figure(builder, data, **params):
+    """資料與參數都沒變時沿用之前建好的圖表，不重新建立"""
+    key = (builder.__name__, frame_fingerprint(data), tuple(sorted(params.items())))
+    return get_figure_cache().get_or_build(key, lambda: builder(data, **params))
+
+@st.cache_resource
+def get_history_store(directory=HISTORY_CACHE_DIR):
+    return HistoryStore(directory)
+
+def get_stock_history(symbol, market, period='6M'):
     try:
-        if market == '美股':
-            ticker = yf.Ticker(symbol)
-        else:  # 台股
-            ticker = yf.Ticker(f"{symbol}.TW")
-        data = ticker.history(period="1d")
-        if not data.empty:
-            return data['Close'].iloc[-1]
-        else:
-            return None
-    except Exception as e:
-        st.error(f"獲取 {symbol} 價格時發生錯誤: {str(e)}")
+        # 本地已有資料時直接使用，最新的 K 棒由背景更新執行緒補抓
+        return load_stock_history(get_history_store(), symbol, market, period, refresh=False)
+    except HistoryUnavailable as e:
+        st.warning(str(e))
         return None
 
-def get_usd_to_twd_rate():
-    try:
-        response = requests.get("https://api.exchangerate-api.com/v4/latest/USD")
-        data = response.json()
-        return data['rates']['TWD']
-    except Exception as e:
-        st.error(f"獲取匯率時發生錯誤: {str(e)}")
-        return 30  # 使用預設匯率
-
-def calculate_performance():
-    performance = []
-    usd_to_twd_rate = get_usd_to_twd_rate()
-    
-    for stock in st.session_state.portfolio:
-        symbol = stock['Symbol']
-        market = stock['Market']
-        
-        current_price = get_current_price(symbol, market)
-        
-        if current_price is not None:
-            buy_transactions = [t for t in stock['Transactions'] if t['Type'] == '買入']
-            sell_transactions = [t for t in stock['Transactions'] if t['Type'] == '賣出']
-            
-            total_buy_quantity = sum(t['Quantity'] for t in buy_transactions)
-            total_sell_quantity = sum(t['Quantity'] for t in sell_transactions)
-            current_quantity = total_buy_quantity - total_sell_quantity
-            
-            total_buy_cost = sum(t['Price'] * t['Quantity'] for t in buy_transactions)
-            total_sell_value = sum(t['Price'] * t['Quantity'] for t in sell_transactions)
-            
-            average_buy_price = total_buy_cost / total_buy_quantity if total_buy_quantity > 0 else 0
-            average_sell_price = total_sell_value / total_sell_quantity if total_sell_quantity > 0 else 0
-            
-            current_value = current_price * current_quantity
-            
-            unrealized_profit_loss = (current_price - average_buy_price) * current_quantity
-            realized_profit_loss = total_sell_value - (average_buy_price * total_sell_quantity)
-            
-            total_invested = total_buy_cost
-            total_profit_loss = unrealized_profit_loss + realized_profit_loss
-            
-            # 更新 performance_pct 的計算
-            if total_invested > 0:
-                performance_pct = (total_profit_loss / total_invested) * 100
-            else:
-                performance_pct = 0
-
-            # 轉換為台幣
-            if market == '美股':
-                current_value *= usd_to_twd_rate
-                total_invested *= usd_to_twd_rate
-                unrealized_profit_loss *= usd_to_twd_rate
-                realized_profit_loss *= usd_to_twd_rate
-                total_profit_loss *= usd_to_twd_rate
-
-            performance.append({
-                'Symbol': symbol,
-                'Name': stock['Name'],
-                'Market': market,
-                'Current Quantity': current_quantity,
-                'Average Buy Price': f"{'US$' if market == '美股' else 'NT$'}{average_buy_price:.2f}",
-                'Average Sell Price': f"{'US$' if market == '美股' else 'NT$'}{average_sell_price:.2f}",
-                'Current Price': f"{'US$' if market == '美股' else 'NT$'}{current_price:.2f}",
-                'Current Value (TWD)': current_value,
-                'Total Invested (TWD)': total_invested,
-                'Unrealized Profit/Loss (TWD)': unrealized_profit_loss,
-                'Realized Profit/Loss (TWD)': realized_profit_loss,
-                'Total Profit/Loss (TWD)': total_profit_loss,
-                'Performance %': performance_pct
-            })
-        else:
-            st.warning(f"無法獲取 {symbol} 的當前價格。")
-    
-    return pd.DataFrame(performance)
-
-tech_color_scheme = [
-    '#007AFF',  # 藍色
-    '#5856D6',  # 紫色
-    '#FF9500',  # 橙色
-    '#FFCC00',  # 黃色
-    '#00C7BE',  # 青色
-    '#AF52DE',  # 淺紫色
-    '#8E8E93',  # 灰色
-    '#FF2D55',  # 珊瑚紅
-    '#64D2FF',  # 天藍色
-    '#5AC8FA'   # 淺藍色
-]
-
-def create_distribution_chart(performance):
-    fig_distribution = px.pie(
-        performance, 
-        values='Current Value (TWD)', 
-        names='Symbol', 
-        title='投資金額占比',
-        color_discrete_sequence=tech_color_scheme,
-        hole=0.4
-    )
-    fig_distribution.update_traces(textposition='inside', textinfo='percent+label')
-    fig_distribution.update_layout(
-        height=400, 
-        margin=dict(l=20, r=20, t=40, b=20),
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='#333333'),
-        title_font_size=18,
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=-0.1,
-            xanchor="center",
-            x=0.5
-        )
-    )
-    return fig_distribution
-
-def create_profit_loss_chart(data, title, value_column='Profit/Loss', is_percentage=False):
-    data_sorted = data.sort_values(value_column, ascending=True)
-    
-    colors = ['#34C759' if x < 0 else '#FF3B30' for x in data_sorted[value_column]]
-    
-    fig = go.Figure(go.Bar(
-        x=data_sorted['Symbol'],
-        y=data_sorted[value_column],
-        marker_color=colors,
-        text=data_sorted[value_column].apply(lambda x: f'{x:.2f}%' if is_percentage else f'${x:,.2f}'),
-        textposition='outside',
-        textfont=dict(size=10, color='#333333'),
-    ))
-    
-    fig.update_layout(
-        title=dict(
-            text=title,
-            font=dict(size=18, color='#333333')
-        ),
-        xaxis_title='股票代號',
-        yaxis_title='收益率 (%)' if is_percentage else '收益/虧損',
-        plot_bgcolor='rgba(0,0,0,0)',
-        paper_bgcolor='rgba(0,0,0,0)',
-        font=dict(color='#333333'),
-        yaxis=dict(zeroline=True, zerolinewidth=1, zerolinecolor='#333333', gridcolor='#E0E0E0'),
-        xaxis=dict(gridcolor='#E0E0E0'),
-        margin=dict(l=20, r=20, t=40, b=20, pad=4),
-        uniformtext_minsize=8,
-        uniformtext_mode='hide',
-        bargap=0.2
-    )
-    
-    fig.update_xaxes(type='category', tickangle=45)
-    fig.update_yaxes(automargin=True)
-    
-    y_max = max(abs(data_sorted[value_column].min()), abs(data_sorted[value_column].max()))
-    fig.update_yaxes(range=[-y_max*1.15, y_max*1.15])
-    
-    return fig
-
-def get_stock_history(symbol, market, period='6mo'):
-    try:
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=180)
-        
-        if market == '美股':
-            ticker = yf.Ticker(symbol)
-        else:  # 台股
-            ticker = yf.Ticker(f"{symbol}.TW")
-        
-        history = ticker.history(start=start_date, end=end_date)
-        
-        if history.empty:
-            st.warning(f"無法獲取 {symbol} 的歷史數據")
-            return None
-        
-        history['Six_Month_Avg'] = history['Close'].mean()
-        return history
-    except Exception as e:
-        st.error(f"獲取 {symbol} 歷史數據時發生錯誤: {str(e)}")
-        return None
-
-def create_six_month_chart(portfolio):
-    fig = make_subplots(rows=len(portfolio), cols=1, subplot_titles=[f"{stock['Symbol']} - {stock['Name']}" for stock in portfolio])
-    
-    for i, stock in enumerate(portfolio, start=1):
-        history = get_stock_history(stock['Symbol'], stock['Market'])
-        if history is not None and not history.empty:
-            if history.index.max() < datetime.now() - timedelta(days=30):
-                st.warning(f"{stock['Symbol']} - {stock['Name']} 的數據可能不是最新的，最後更新日期為 {history.index.max().date()}")
-            
-            fig.add_trace(
-                go.Scatter(x=history.index, y=history['Close'], name=stock['Symbol']),
-                row=i, col=1
-            )
-    
-    fig.update_layout(
-        title=f"{selected_stock} 半年走勢與成交量",
-        height=500,  # 增加圖表高度
-        margin=dict(l=20, r=20, t=40, b=100),
-        plot_bgcolor='rgba(255,255,255,0)',  # 保持繪圖區域透明
-        paper_bgcolor='rgba(255,255,255,0.8)',  # 設置輕微的背景色
-        font=dict(color='black'),
-        legend=dict(
-            orientation="h",
-            yanchor="bottom",
-            y=-0.3,
-            xanchor="center",
-            x=0.5,
-            bgcolor="rgba(255,255,255,0.5)",  # 半透明背景
-            bordercolor="rgba(0,0,0,0)",      # 移除邊框
-            borderwidth=0
-        ),
-        yaxis=dict(range=[y_min - y_padding, y_max + y_padding])  # 設置新的y軸範圍
-    )
-
-    # 添加一個不可見的邊框來創造圓角效果
-    fig.update_layout(
-        shapes=[
-            dict(
-                type="rect",
-                xref="paper",
-                yref="paper",
-                x0=0,
-                y0=0,
-                x1=1,
-                y1=1,
-                line=dict(
-                    color="rgba(255,255,255,0)",
-                    width=0,
-                ),
-                fillcolor="rgba(255,255,255,0.8)",
-                layer="below"
-            )
-        ]
-    )
-
-    # 更新 x 軸和 y 軸的外觀
-    fig.update_xaxes(
-        showline=True,
-        linewidth=1,
-        linecolor='lightgray',
-        mirror=True
-    )
-    fig.update_yaxes(
-        showline=True,
-        linewidth=1,
-        linecolor='lightgray',
-        mirror=True
-    )
-
-    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-
-    return fig
+@st.cache_resource
+def get_background_refresher():
+    return BackgroundRefresher(get_quote_cache(), get_fx_rates(), get_history_store())
+
+@st.cache_resource
+def get_equity_store(directory=EQUITY_CACHE_DIR):
+    return EquityCurveStore(directory)
+
+def get_equity_curve(portfolio, position_book):
+    """以本地歷史股價補上每日總值序列，不連網；回傳 (序列, 沒有歷史股價而不計入的股票)
+
+    帳本版本、日期與各股票歷史資料的更新時間都沒變時沿用這個 session 上次的結果，
+    一般的 rerun 不必重建整份帳本。
+    """
+    positions = position_book.positions
+    stocks = list(zip(positions.index, positions['Market']))
+    history_store = get_history_store()
+    key = (position_book.version, datetime.now().date(), tuple(history_store.updated_at(to_yf_ticker(symbol, market)) for symbol, market in stocks))
+    cached = st.session_state.get('equity_curve')
+    if cached is None or cached[0] != key:
+        closes = load_closes(history_store, stocks)
+        curve, missing = get_equity_store().update('my_portfolio', build_ledger(portfolio), positions['Market'], closes, get_fx_rates())
+        cached = st.session_state.equity_curve = (key, curve, missing)
+    return cached[1], cached[2]
+
+def format_age(timestamp, now=None):
+    """把 epoch 秒轉成「N 分鐘前」之類的文字"""
+    seconds = max(0, (now or time.time()) - timestamp)
+    if seconds < 60:
+        return '剛剛'
+    if seconds < 60 * 60:
+        return f'{seconds // 60:.0f} 分鐘前'
+    if seconds < 24 * 60 * 60:
+        return f'{seconds // 3600:.0f} 小時前'
+    return f'{seconds // 86400:.0f} 天前'
+
+@st.cache_resource
+def get_stock_info_resolver():
+    return StockInfoResolver(get_current_price)
 
 def get_stock_info(symbol):
     try:
-        # 先嘗試作為台股查詢
-        stock = yf.Ticker(f"{symbol}.TW")
-        info = stock.info
-        if info and 'longName' in info:
-            current_price = stock.history(period="1d")['Close'].iloc[-1]
-            return info['longName'], '台股', current_price
-        
-        # 如果台股查詢失敗,嘗試作為美股查詢
-        stock = yf.Ticker(symbol)
-        info = stock.info
-        if info and 'longName' in info:
-            current_price = stock.history(period="1d")['Close'].iloc[-1]
-            return info['longName'], '美股', current_price
-        
-        return None, None, None
-    except requests.exceptions.HTTPError as e:
-        if e.response.status_code == 404:
-            st.warning(f"找不到股票代號 '{symbol}' 的資訊。請確認股票代號是否正確。")
-        else:
-            st.error(f"查詢股票資訊時發生網路錯誤：{e}")
-    except Exception as e:
-        st.error(f"查詢股票資訊時發生未知錯誤：{str(e)}")
+        return get_stock_info_resolver().resolve(symbol)
+    except SymbolNotFound as e:
+        st.warning(str(e))
+    except SymbolLookupError as e:
+        st.error(str(e))
     return None, None, None
 
+@st.cache_resource
+def get_symbol_directory():
+    return load_symbol_directory()
+
 st.title('我的韭菜日記')
 
+# 還有報價在載入時，總覽區自動重畫的間隔 (秒)
+PROGRESSIVE_POLL_INTERVAL = 2
+# 即時報價：交易時段內更新報價的間隔選項與預設值 (秒)
+LIVE_QUOTE_INTERVALS = [5, 10, 15, 30, 60]
+LIVE_QUOTE_INTERVAL = 15
+
+def live_quote_interval(positions):
+    """即時報價開啟且持股的市場有正在交易的時候，回傳更新報價的間隔秒數，否則回傳 None"""
+    if not st.session_state.get('live_quotes') or not any(is_market_open(market) for market in positions['Market'].unique()):
+        return None
+    return st.session_state.get('live_quote_interval', LIVE_QUOTE_INTERVAL)
+
+def refresh_live_quotes(positions, interval):
+    """重新抓取交易中市場超過 interval 秒的報價；多個 session 同時更新時共用同一個請求
+
+    在定時重畫的 fragment 中呼叫：持股的市場都已收盤時重新執行整個頁面，讓 fragment 停止定時重畫。
+    """
+    stocks = [(symbol, market) for symbol, market in zip(positions.index, positions['Market']) if is_market_open(market)]
+    if not stocks:
+        st.rerun()
+    get_quote_cache().refresh(stocks, max_age=interval)
+
+def as_fragment(render, run_every=None):
+    """以 st.fragment 執行 render：定時重畫這一區時頁面不會從頭執行，這段的效能統計另外記成一筆"""
+    @functools.wraps(render)
+    def fragment(*args, **kwargs):
+        with collect('fragment', get_run_log()):
+            return render(*args, **kwargs)
+    return st.fragment(fragment, run_every=run_every)
+
+def render_portfolio_overview(position_book, fx_rates, polling=False, live_interval=None):
+    """畫出總覽指標、匯率資訊與投資組合圖表，回傳估值結果
+
+    以 st.fragment 執行：還有報價在載入時只重畫這一區，報價到齊後再重新執行整個頁面；
+    即時報價開啟時每 live_interval 秒更新報價並重畫這一區。
+    """
+    if live_interval:
+        refresh_live_quotes(position_book.positions, live_interval)
+    prices, quotes_fetched_at, pending, _ = read_portfolio_quotes(position_book.positions)
+    if polling and not pending:
+        # 報價已到齊，重新執行整個頁面讓走勢圖與明細也使用完整的估值
+        st.rerun()
+
+    performance = position_book.value(prices, fx_rates)
+    if pending:
+        st.info(f"正在取得 {', '.join(pending)} 的報價，完成後會自動更新")
+    if performance.empty:
+        return performance
+
+    fx_table = fx_rates.table()
+    usd_to_twd_rate = fx_rates.rate('USD', 'TWD')
+
+    # 顯示總體概況
+    total_investment = performance['Total Invested (TWD)'].sum()
+    total_current_value = performance['Current Value (TWD)'].sum()
+    total_unrealized_profit_loss = performance['Unrealized Profit/Loss (TWD)'].sum()
+    total_realized_profit_loss = performance['Realized Profit/Loss (TWD)'].sum()
+    total_performance = ((total_unrealized_profit_loss + total_realized_profit_loss) / total_investment) * 100 if total_investment != 0 else 0
+    total_realized_performance = (total_realized_profit_loss / total_investment) * 100 if total_investment != 0 else 0
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("總投資", f"NT${total_investment:,.0f}")
+    col2.metric("當前價值", f"NT${total_current_value:,.0f}")
+    col3.metric("未實現損益", f"NT${total_unrealized_profit_loss:,.0f}", f"{total_performance:.2f}%", delta_color="inverse")
+    col4.metric("已實現損益", f"NT${total_realized_profit_loss:,.0f}", f"{total_realized_performance:.2f}%", delta_color="inverse")
+
+    # 顯示匯率資訊
+    quotes_age = format_age(quotes_fetched_at) if quotes_fetched_at else '尚未取得'
+    if live_interval:
+        quotes_age += f'，即時更新中 (每 {live_interval} 秒)'
+    st.markdown(f"<div style='text-align: right; color: gray; font-size: 0.8em;'>當前匯率：1 USD = {usd_to_twd_rate:.2f} TWD（更新於 {datetime.fromtimestamp(fx_table['fetched_at']):%Y-%m-%d %H:%M}，{format_age(fx_table['fetched_at'])}）｜報價更新於 {quotes_age}</div>", unsafe_allow_html=True)
+
+    st.subheader('投資組合分析')
+
+    # 其他三個圖表分兩行顯示
+    col1, col2 = st.columns(2)
+
+    with col1:
+        fig_distribution = cached_figure(create_distribution_chart, performance[['Symbol', 'Current Value (TWD)']])
+        st.plotly_chart(fig_distribution, use_container_width=True, config={'displayModeBar': False})
+
+    with col2:
+        fig_absolute = cached_figure(create_profit_loss_chart, performance[['Symbol', 'Total Profit/Loss (TWD)']], title='股票收益/虧損金額', value_column='Total Profit/Loss (TWD)', height=400)
+        st.plotly_chart(fig_absolute, use_container_width=True, config={'displayModeBar': False})
+
+    fig_percentage = cached_figure(create_profit_loss_chart, performance[['Symbol', 'Performance %']], title='股票收益率', value_column='Performance %', is_percentage=True, height=400)
+    st.plotly_chart(fig_percentage, use_container_width=True, config={'displayModeBar': False})
+
+    return performance
+
+def render_portfolio_details(position_book, fx_rates, live_interval=None):
+    """投資組合詳情表格 (現價、市值與損益欄位)；即時報價開啟時與總覽區一起定時重畫"""
+    if live_interval:
+        refresh_live_quotes(position_book.positions, live_interval)
+    prices, _, _, _ = read_portfolio_quotes(position_book.positions)
+    performance = position_book.value(prices, fx_rates)
+
+    def color_profit_loss(val):
+        color = '#FF3B30' if val > 0 else '#34C759'
+        return f'color: {color}'
+
+    # 將表格分為兩部分
+    performance_part1 = performance[['Symbol', 'Name', 'Market', 'Current Quantity', 'Average Buy Price', 'Current Price']]
+    performance_part2 = performance[['Symbol', 'Current Value (TWD)', 'Unrealized Profit/Loss (TWD)', 'Realized Profit/Loss (TWD)', 'Total Profit/Loss (TWD)', 'Performance %']]
+
+    # 格式化和樣式設置第一部分
+    styled_df1 = performance_part1.style.format({
+        'Current Quantity': '{:,.0f}',
+        'Average Buy Price': lambda x: x,
+        'Current Price': lambda x: x,
+    })
+
+    # 格式化和樣式設置第二部分
+    styled_df2 = performance_part2.style.format({
+        'Current Value (TWD)': 'NT${:,.0f}',
+        'Unrealized Profit/Loss (TWD)': 'NT${:,.0f}',
+        'Realized Profit/Loss (TWD)': 'NT${:,.0f}',
+        'Total Profit/Loss (TWD)': 'NT${:,.0f}',
+        'Performance %': '{:.2f}%'
+    }).map(color_profit_loss, subset=['Unrealized Profit/Loss (TWD)', 'Realized Profit/Loss (TWD)', 'Total Profit/Loss (TWD)', 'Performance %'])
+
+    # 顯示兩個表格，上下排列
+    st.markdown("### 基本資訊")
+    st.dataframe(styled_df1, hide_index=True, use_container_width=True, height=200)
+
+    st.markdown("### 收益資訊")
+    st.dataframe(styled_df2, hide_index=True, use_container_width=True, height=200)
+
 # 側邊欄
 with st.sidebar:
     st.header('管理投資組合')
+    cost_method = st.radio('成本計算方式', list(COST_METHODS), index=list(COST_METHODS).index(DEFAULT_COST_METHOD), format_func=COST_METHODS.get,
+                           key='cost_method', help='計算已實現與未實現損益時，賣出的股數要對應到哪些買入成本')
+    if st.toggle('即時報價', key='live_quotes', help='交易時段內定時更新報價，只重畫總覽指標、損益圖與現價、市值欄位，走勢圖與交易記錄不會重新建立'):
+        st.select_slider('更新間隔 (秒)', options=LIVE_QUOTE_INTERVALS, value=LIVE_QUOTE_INTERVAL, key='live_quote_interval')
     
     def reset_form_values():
         if 'form_values' not in st.session_state:
@@ -527,19 +536,35 @@ with st.sidebar:
     
     with st.expander("記錄新交易", expanded=False):
         reset_form_values()
+        symbol_directory = get_symbol_directory()
         
-        with st.form("search_stock_form"):
-            symbol = st.text_input('股票代號', value=st.session_state.form_values['symbol']).upper()
-            search_button = st.form_submit_button('搜尋股票資訊')
+        symbol_query = st.text_input('股票代號', value=st.session_state.form_values['symbol'], placeholder='輸入代號或名稱，例如 2330、台積電、AAPL')
+        symbol = symbol_query.strip().upper()
+        matches = symbol_directory.search(symbol_query)
+        if matches:
+            # 預設使用輸入的代號 (代號完全相符時預設選該筆)；模糊比對的結果只有使用者選取時才會採用
+            options = [None] + matches
+            exact = next((i for i, match in enumerate(options) if match is not None and match[0] == symbol), 0)
+            selected_match = st.selectbox('符合的股票', options, index=exact,
+                                          format_func=lambda match: f"使用輸入的代號 {symbol}" if match is None else f"{match[0]} {match[1]} ({match[2]})")
+            if selected_match is not None:
+                symbol = selected_match[0]
+        search_button = st.button('搜尋股票資訊')
         
         name = None
         market = None
         current_price = None
         
         if search_button and symbol:
-            with st.spinner('正在查詢股票資訊...'):
-                time.sleep(0.5)
-                name, market, current_price = get_stock_info(symbol)
+            directory_entry = symbol_directory.lookup(symbol)
+            if directory_entry:
+                # 代號目錄已知名稱與市場，只需要向網路確認價格
+                name, market = directory_entry
+                with st.spinner('正在確認股價...'):
+                    current_price = get_current_price(symbol, market)
+            else:
+                with st.spinner('正在查詢股票資訊...'):
+                    name, market, current_price = get_stock_info(symbol)
             
             if name and market and current_price:
                 st.success(f"已找到股票: {name} ({market})")
@@ -576,6 +601,8 @@ with st.sidebar:
                 existing_stock = next((stock for stock in st.session_state.portfolio if stock['Symbol'] == symbol), None)
                 if existing_stock:
                     existing_stock['Transactions'].append(new_transaction)
+                    get_position_book().apply_transaction(existing_stock, new_transaction)
+                    write_portfolio_change(lambda log: log.add_transaction(existing_stock, new_transaction))
                 else:
                     new_stock = {
                         'Symbol': symbol,
@@ -584,8 +611,9 @@ with st.sidebar:
                         'Transactions': [new_transaction]
                     }
                     st.session_state.portfolio.append(new_stock)
+                    get_position_book().rebuild(new_stock)
+                    write_portfolio_change(lambda log: log.add_transaction(new_stock, new_transaction))
                 
-                save_portfolio()
                 st.success('已成功記錄交易')
                 
                 # 更新表單值以保留剛剛添加的資訊
@@ -601,6 +629,15 @@ with st.sidebar:
                 
                 st.rerun()
 
+        if st.button('更新股票代號清單', help=f'目前清單共 {len(symbol_directory):,} 筆，更新會從證交所、櫃買中心與 NASDAQ 下載完整清單'):
+            try:
+                with st.spinner('正在下載股票代號清單...'):
+                    count = refresh_symbol_directory()
+                get_symbol_directory.clear()
+                st.success(f'已更新股票代號清單，共 {count:,} 筆')
+            except Exception as e:
+                st.error(f"更新股票代號清單時發生錯誤：{str(e)}")
+
     if st.session_state.portfolio:
         with st.expander("刪除交易", expanded=False):
             stock_to_delete = st.selectbox('選擇要刪除交易的股票', [f"{stock['Symbol']} - {stock['Name']}" for stock in st.session_state.portfolio])
@@ -616,359 +653,148 @@ with st.sidebar:
 
                     if transaction_to_delete and st.button('刪除選中的交易', key='delete_transaction_button'):
                         index_to_delete = transaction_options.index(transaction_to_delete)
+                        deleted_transaction = reversed_transactions[index_to_delete]
                         # 從反轉後的列表中刪除，然後再次反轉以保持原始順序
                         del reversed_transactions[index_to_delete]
                         selected_stock['Transactions'] = reversed_transactions[::-1]
 
                         if not selected_stock['Transactions']:
                             st.session_state.portfolio = [stock for stock in st.session_state.portfolio if stock['Symbol'] != symbol_to_delete]
+                            get_position_book().remove(symbol_to_delete)
+                        else:
+                            get_position_book().rebuild(selected_stock)
 
-                        save_portfolio()
+                        write_portfolio_change(lambda log: log.delete_transaction(symbol_to_delete, len(reversed_transactions) - index_to_delete, deleted_transaction))
                         st.success(f'已刪除 {stock_to_delete} 的交易：{transaction_to_delete}')
                         st.rerun()
                 else:
                     st.info('該股票沒有交易記錄')
 
 # 主要內容區
+position_book = get_position_book()
+if st.session_state.pop('position_book_stale', False):
+    position_book.sync(st.session_state.portfolio)
+position_book.set_cost_method(cost_method, st.session_state.portfolio)
+
 if st.session_state.portfolio:
-    performance = calculate_performance()
-    
+    fx_rates = get_fx_rates()
+    fx_table = fx_rates.table()
+    if fx_rates.error:
+        if fx_table['source'] == 'fallback':
+            st.error(f"獲取匯率時發生錯誤: {fx_rates.error}，使用預設匯率")
+        else:
+            st.warning(f"無法更新匯率，使用 {datetime.fromtimestamp(fx_table['fetched_at']):%Y-%m-%d %H:%M} 的匯率")
+
+    prices, quotes_fetched_at, pending, failed = read_portfolio_quotes(position_book.positions)
+    if failed:
+        st.warning(f"無法獲取以下股票的當前價格：{', '.join(failed)}")
+
+    # 總覽與圖表先用快取中的報價畫出；還有報價在載入時，或開啟即時報價時，只有這一區會定時重畫
+    live_interval = live_quote_interval(position_book.positions)
+    render_overview = as_fragment(render_portfolio_overview, run_every=PROGRESSIVE_POLL_INTERVAL if pending else live_interval)
+    performance = render_overview(position_book, fx_rates, polling=bool(pending), live_interval=live_interval)
+    positions = position_book.positions
+
+    equity_curve, equity_missing = get_equity_curve(st.session_state.portfolio, position_book)
+    if not equity_curve.empty:
+        st.plotly_chart(cached_figure(create_equity_curve_chart, equity_curve), use_container_width=True, config={'displayModeBar': False})
+    if equity_missing:
+        st.caption(f"每日總值未計入沒有歷史股價的股票：{', '.join(equity_missing)}")
+
     if not performance.empty:
-        usd_to_twd_rate = get_usd_to_twd_rate()
-        
-        # 顯示總體概況
-        total_investment = performance['Total Invested (TWD)'].sum()
-        total_current_value = performance['Current Value (TWD)'].sum()
-        total_unrealized_profit_loss = performance['Unrealized Profit/Loss (TWD)'].sum()
-        total_realized_profit_loss = performance['Realized Profit/Loss (TWD)'].sum()
-        total_performance = ((total_unrealized_profit_loss + total_realized_profit_loss) / total_investment) * 100 if total_investment != 0 else 0
-        total_realized_performance = (total_realized_profit_loss / total_investment) * 100 if total_investment != 0 else 0
-
-        col1, col2, col3, col4 = st.columns(4)
-        col1.metric("總投資", f"NT${total_investment:,.0f}")
-        col2.metric("當前價值", f"NT${total_current_value:,.0f}")
-        col3.metric("未實現損益", f"NT${total_unrealized_profit_loss:,.0f}", f"{total_performance:.2f}%", delta_color="inverse")
-        col4.metric("已實現損益", f"NT${total_realized_profit_loss:,.0f}", f"{total_realized_performance:.2f}%", delta_color="inverse")
-
-        # 顯示匯率資訊
-        st.markdown(f"<div style='text-align: right; color: gray; font-size: 0.8em;'>當前匯率：1 USD = {usd_to_twd_rate:.2f} TWD</div>", unsafe_allow_html=True)
-
-        st.subheader('投資組合分析')
-
-        # 其他三個圖表分兩行顯示
-        col1, col2 = st.columns(2)
-
-        with col1:
-            fig_distribution = create_distribution_chart(performance)
-            st.plotly_chart(fig_distribution, use_container_width=True, config={'displayModeBar': False})
-
-        with col2:
-            fig_absolute = create_profit_loss_chart(performance, title='股票收益/虧損金額', value_column='Total Profit/Loss (TWD)')
-            fig_absolute.update_layout(height=400)
-            st.plotly_chart(fig_absolute, use_container_width=True, config={'displayModeBar': False})
-
-        fig_percentage = create_profit_loss_chart(performance, title='股票收益率', value_column='Performance %', is_percentage=True)
-        fig_percentage.update_layout(height=400)
-        st.plotly_chart(fig_percentage, use_container_width=True, config={'displayModeBar': False})
-
-        # 半年股價走勢分析 (佔據整行)
-        st.subheader('半年股價走勢分析')
+        # 股價走勢分析 (佔據整行)
+        st.subheader('股價走勢分析')
     
         # 計算每支股票的投資金額佔比
         total_investment = performance['Current Value (TWD)'].sum()
-        performance['Investment Percentage'] = performance['Current Value (TWD)'] / total_investment * 100
+        performance = performance.assign(**{'Investment Percentage': performance['Current Value (TWD)'] / total_investment * 100})
 
         # 根據投資金額佔比排序股票選項
         sorted_stock_options = performance.sort_values('Investment Percentage', ascending=False).apply(lambda row: f"{row['Symbol']} - {row['Name']} ({row['Investment Percentage']:.2f}%)", axis=1).tolist()
-        selected_stock = st.selectbox('選擇股票查看半年走勢', sorted_stock_options)
+        selected_stock = st.selectbox('選擇股票查看走勢', sorted_stock_options)
+        history_range = st.radio('走勢區間', list(HISTORY_RANGES), index=list(HISTORY_RANGES).index('6M'), format_func=HISTORY_RANGES.get, horizontal=True)
 
         # 從選擇的選項中提取股票代號
         selected_symbol = selected_stock.split(' - ')[0]
-        selected_stock_info = next((stock for stock in st.session_state.portfolio if stock['Symbol'] == selected_symbol), None)
+        selected_position = positions.loc[selected_symbol] if selected_symbol in positions.index else None
         
-        if selected_stock_info:
-            history = get_stock_history(selected_stock_info['Symbol'], selected_stock_info['Market'])
+        if selected_position is not None:
+            history = get_stock_history(selected_symbol, selected_position['Market'], history_range)
             if history is not None and not history.empty:
-                # 計算平均買入價格和平均賣出價格
-                buy_transactions = [t for t in selected_stock_info['Transactions'] if t['Type'] == '買入']
-                sell_transactions = [t for t in selected_stock_info['Transactions'] if t['Type'] == '賣出']
-                
-                total_buy_quantity = sum(t['Quantity'] for t in buy_transactions)
-                total_sell_quantity = sum(t['Quantity'] for t in sell_transactions)
-                
-                total_buy_cost = sum(t['Price'] * t['Quantity'] for t in buy_transactions)
-                total_sell_value = sum(t['Price'] * t['Quantity'] for t in sell_transactions)
-                
-                average_buy_price = total_buy_cost / total_buy_quantity if total_buy_quantity > 0 else 0
-                average_sell_price = total_sell_value / total_sell_quantity if total_sell_quantity > 0 else 0
+                # 平均買入價格和平均賣出價格
+                average_buy_price = selected_position['Average Buy Price']
+                average_sell_price = selected_position['Average Sell Price']
 
                 # 確定貨幣單位
-                currency = 'US$' if selected_stock_info['Market'] == '美股' else 'NT$'
-
-                # 創建子圖
-                fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.1, row_heights=[0.7, 0.3])
-
-                # 添加價格線
-                fig.add_trace(go.Scatter(
-                    x=history.index, 
-                    y=history['Close'], 
-                    mode='lines', 
-                    name='收盤價',
-                    line=dict(color=tech_color_scheme[2], width=2)
-                ), row=1, col=1)
-
-                # 添加平均買入價格線
-                fig.add_trace(go.Scatter(
-                    x=[history.index[0], history.index[-1]],
-                    y=[average_buy_price, average_buy_price],
-                    mode='lines',
-                    name='平均買入價格',
-                    line=dict(color=tech_color_scheme[3], dash='dash', width=3)
-                ), row=1, col=1)
-
-                # 添加半年均價線
-                fig.add_trace(go.Scatter(
-                    x=[history.index[0], history.index[-1]],
-                    y=[history['Six_Month_Avg'].iloc[0], history['Six_Month_Avg'].iloc[0]],
-                    mode='lines',
-                    name='半年均價',
-                    line=dict(color=tech_color_scheme[4], dash='dot', width=3)
-                ), row=1, col=1)
-
-                # 添加最高價和最低價標記
-                highest_price = history['Close'].max()
-                lowest_price = history['Close'].min()
-                highest_date = history['Close'].idxmax()
-                lowest_date = history['Close'].idxmin()
-
-                fig.add_trace(go.Scatter(
-                    x=[highest_date],
-                    y=[highest_price],
-                    mode='markers+text',
-                    name='最高價',
-                    text=[f'${highest_price:.2f}'],
-                    textposition='top center',
-                    marker=dict(color=tech_color_scheme[6], size=10, symbol='triangle-up'),
-                    showlegend=False
-                ), row=1, col=1)
-
-                fig.add_trace(go.Scatter(
-                    x=[lowest_date],
-                    y=[lowest_price],
-                    mode='markers+text',
-                    name='最低價',
-                    text=[f'${lowest_price:.2f}'],
-                    textposition='bottom center',
-                    marker=dict(color=tech_color_scheme[1], size=10, symbol='triangle-down'),
-                    showlegend=False
-                ), row=1, col=1)
-
-                # 添加成交量圖
-                fig.add_trace(go.Bar(
-                    x=history.index,
-                    y=history['Volume'],
-                    name='成交量',
-                    marker_color=tech_color_scheme[3],
-                    opacity=0.7
-                ), row=2, col=1)
-
-                # 調整y軸範圍
-                y_min = min(history['Close'].min(), average_buy_price, history['Six_Month_Avg'].iloc[0])
-                y_max = max(history['Close'].max(), average_buy_price, history['Six_Month_Avg'].iloc[0])
-                y_range = y_max - y_min
-                y_padding = y_range * 0.15  # 增加15%的空間
-
-                fig.update_layout(
-                    title=f"{selected_stock} 半年走勢與成交量",
-                    autosize=True,
-                    margin=dict(l=20, r=20, t=40, b=20),  # 調整邊距
-                    height=500,
-                    plot_bgcolor='rgba(255,255,255,0)',  # 保持繪圖區域透明
-                    paper_bgcolor='rgba(255,255,255,0.8)',  # 設置輕微的背景色
-                    font=dict(color='black'),
-                    legend=dict(
-                        orientation="h",
-                        yanchor="bottom",
-                        y=-0.3,
-                        xanchor="center",
-                        x=0.5,
-                        bgcolor="rgba(255,255,255,0.5)",  # 半透明背景
-                        bordercolor="rgba(0,0,0,0)",      # 移除邊框
-                        borderwidth=0
-                    ),
-                    yaxis=dict(range=[y_min - y_padding, y_max + y_padding])  # 設置新的y軸範圍
-                )
-
-                # 添加一個不可見的邊框來創造圓角效果
-                fig.update_layout(
-                    shapes=[
-                        dict(
-                            type="rect",
-                            xref="paper",
-                            yref="paper",
-                            x0=0,
-                            y0=0,
-                            x1=1,
-                            y1=1,
-                            line=dict(
-                                color="rgba(255,255,255,0)",
-                                width=0,
-                            ),
-                            fillcolor="rgba(255,255,255,0.8)",
-                            layer="below"
-                        )
-                    ]
-                )
-
-                # 更新子圖的標題和軸標籤
-                fig.update_xaxes(title_text="日期", row=2, col=1)
-                fig.update_yaxes(title_text="價格", row=1, col=1)
-                fig.update_yaxes(title_text="成交量", row=2, col=1)
-
-                # 更新 x 軸和 y 軸的外觀
-                fig.update_xaxes(
-                    showline=True,
-                    linewidth=1,
-                    linecolor='lightgray',
-                    mirror=True
-                )
-                fig.update_yaxes(
-                    showline=True,
-                    linewidth=1,
-                    linecolor='lightgray',
-                    mirror=True
-                )
-
-                fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-                fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
-
-                # 添加註釋來標記平均買入價格和半年均價
-                fig.add_annotation(
-                    x=history.index[-1],
-                    y=average_buy_price,
-                    text=f"平均買入價格: {currency}{average_buy_price:.2f}",
-                    showarrow=True,
-                    arrowhead=2,
-                    arrowsize=1,
-                    arrowwidth=2,
-                    arrowcolor=tech_color_scheme[3],
-                    ax=50,
-                    ay=-30,
-                    row=1, col=1
-                )
-                fig.add_annotation(
-                    x=history.index[-1],
-                    y=history['Six_Month_Avg'].iloc[0],
-                    text=f"半年均價: {currency}{history['Six_Month_Avg'].iloc[0]:.2f}",
-                    showarrow=True,
-                    arrowhead=2,
-                    arrowsize=1,
-                    arrowwidth=2,
-                    arrowcolor=tech_color_scheme[4],
-                    ax=50,
-                    ay=30,
-                    row=1, col=1
-                )
-
-                # 添加平均賣出價格線
-                if average_sell_price > 0:
-                    fig.add_trace(go.Scatter(
-                        x=[history.index[0], history.index[-1]],
-                        y=[average_sell_price, average_sell_price],
-                        mode='lines',
-                        name='平均賣出價格',
-                        line=dict(color=tech_color_scheme[5], dash='dash', width=3)
-                    ), row=1, col=1)
-
-                    # 動態調整註釋位置
-                    prices = [average_buy_price, history['Six_Month_Avg'].iloc[0], average_sell_price]
-                    prices.sort()
-                    sell_price_index = prices.index(average_sell_price)
-
-                    if sell_price_index == 0:  # 最低
-                        annotation_ax = 50
-                        annotation_ay = 30
-                    elif sell_price_index == 1:  # 中間
-                        annotation_ax = -50
-                        annotation_ay = -60 if average_sell_price > prices[0] + (prices[2] - prices[0]) / 2 else 60
-                    else:  # 最高
-                        annotation_ax = -50
-                        annotation_ay = -30
-
-                    fig.add_annotation(
-                        x=history.index[-9],
-                        y=average_sell_price,
-                        text=f"平均賣出價格: {currency}{average_sell_price:.2f}",
-                        showarrow=True,
-                        arrowhead=2,
-                        arrowsize=1,
-                        arrowwidth=2,
-                        arrowcolor=tech_color_scheme[5],
-                        ax=annotation_ax,
-                        ay=annotation_ay,
-                        row=1, col=1
-                    )
+                currency = 'US$' if selected_position['Market'] == '美股' else 'NT$'
+
+                fig = cached_figure(create_price_history_chart, history, title=selected_stock, range_label=HISTORY_RANGES[history_range], currency=currency,
+                                    average_buy_price=average_buy_price, average_sell_price=average_sell_price)
 
                 st.plotly_chart(fig, use_container_width=True, config={'displayModeBar': False})
+                history_updated_at = get_history_store().updated_at(to_yf_ticker(selected_symbol, selected_position['Market']))
+                if history_updated_at:
+                    st.caption(f"走勢資料更新於 {format_age(history_updated_at)}")
 
-                # 將買入均價、賣出均價和半年均價資訊並排顯示
+                # 將買入均價、賣出均價和區間均價資訊並排顯示
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     st.markdown(f"<div style='text-align: center;'><p style='background-color: #E6F3FF; padding: 10px; border-radius: 5px;'>平均買入價格: {currency}{average_buy_price:.2f}</p></div>", unsafe_allow_html=True)
                 with col2:
                     st.markdown(f"<div style='text-align: center;'><p style='background-color: #FFE6E6; padding: 10px; border-radius: 5px;'>平均賣出價格: {currency}{average_sell_price:.2f}</p></div>", unsafe_allow_html=True)
                 with col3:
-                    st.markdown(f"<div style='text-align: center;'><p style='background-color: #E6F3FF; padding: 10px; border-radius: 5px;'>半年均價: {currency}{history['Six_Month_Avg'].iloc[0]:.2f}</p></div>", unsafe_allow_html=True)
+                    st.markdown(f"<div style='text-align: center;'><p style='background-color: #E6F3FF; padding: 10px; border-radius: 5px;'>{HISTORY_RANGES[history_range]}均價: {currency}{history['Close'].mean():.2f}</p></div>", unsafe_allow_html=True)
             else:
                 st.warning(f"無法獲 {selected_stock} 的歷史數據")
         else:
             st.warning("請選擇一支股票")
 
-        # 顯示詳細的投資組合表格
-        with st.expander("投資組合詳情", expanded=False):            
-            def color_profit_loss(val):
-                color = '#FF3B30' if val > 0 else '#34C759'
-                return f'color: {color}'
-
-            # 將表格分為兩部分
-            performance_part1 = performance[['Symbol', 'Name', 'Market', 'Current Quantity', 'Average Buy Price', 'Current Price']]
-            performance_part2 = performance[['Symbol', 'Current Value (TWD)', 'Unrealized Profit/Loss (TWD)', 'Realized Profit/Loss (TWD)', 'Total Profit/Loss (TWD)', 'Performance %']]
-
-            # 格式化和樣式設置第一部分
-            styled_df1 = performance_part1.style.format({
-                'Current Quantity': '{:,.0f}',
-                'Average Buy Price': lambda x: x,
-                'Current Price': lambda x: x,
-            })
-
-            # 格式化和樣式設置第二部分
-            styled_df2 = performance_part2.style.format({
-                'Current Value (TWD)': 'NT${:,.0f}',
-                'Unrealized Profit/Loss (TWD)': 'NT${:,.0f}',
-                'Realized Profit/Loss (TWD)': 'NT${:,.0f}',
-                'Total Profit/Loss (TWD)': 'NT${:,.0f}',
-                'Performance %': '{:.2f}%'
-            }).map(color_profit_loss, subset=['Unrealized Profit/Loss (TWD)', 'Realized Profit/Loss (TWD)', 'Total Profit/Loss (TWD)', 'Performance %'])
-
-            # 顯示兩個表格，上下排列
-            st.markdown("### 基本資訊")
-            st.dataframe(styled_df1, hide_index=True, use_container_width=True, height=200)
-            
-            st.markdown("### 收益資訊")
-            st.dataframe(styled_df2, hide_index=True, use_container_width=True, height=200)
-
-        # 顯示每支股票的詳細購買記錄
-        with st.expander("查看詳細購買記錄", expanded=False):
-            for stock in st.session_state.portfolio:
-                st.subheader(f"{stock['Name']} ({stock['Symbol']})")
-                transactions_df = pd.DataFrame(stock['Transactions'])
-                st.dataframe(
-                    transactions_df.style.format({
-                        'Price': '${:.2f}',
-                        'Quantity': '{:,.0f}'
-                    }),
-                    hide_index=True
-                )
-
-    else:
-        st.info('您的投資組合目前為空。請使用側邊欄開始記錄交易。')
\ No newline at end of file
+        # 顯示詳細的投資組合表格 (展開時才建立表格)
+        details_expander = st.expander("投資組合詳情", expanded=False, key='portfolio_details_expander', on_change='rerun')
+        with details_expander:
+            if details_expander.open:
+                as_fragment(render_portfolio_details, run_every=live_interval)(position_book, fx_rates, live_interval)
+
+        # 顯示每支股票的詳細購買記錄 (展開時才建立表格)
+        records_expander = st.expander("查看詳細購買記錄", expanded=False, key='transaction_records_expander', on_change='rerun')
+        with records_expander:
+            if records_expander.open:
+                for stock in st.session_state.portfolio:
+                    st.subheader(f"{stock['Name']} ({stock['Symbol']})")
+                    transactions_df = pd.DataFrame(stock['Transactions'])
+                    st.dataframe(
+                        transactions_df.style.format({
+                            'Price': '${:.2f}',
+                            'Quantity': '{:,.0f}'
+                        }),
+                        hide_index=True
+                    )
+
+    elif not pending:
+        st.info('您的投資組合目前為空。請使用側邊欄開始記錄交易。')
+
+# 效能資訊：這次 rerun 各階段的耗時、呼叫次數、抓取的資料量與快取命中率
+def show_stage_table(stages):
+    table = pd.DataFrame.from_dict(stages, orient='index').rename_axis('階段').sort_values('seconds', ascending=False)
+    table = table.assign(ms=table['seconds'] * 1000).drop(columns='seconds')
+    st.dataframe(table, use_container_width=True, column_config={'calls': '次數', 'ms': st.column_config.NumberColumn('毫秒', format='%.1f'), 'bytes': '位元組'})
+
+run_stats = end_run(get_run_log())
+with st.sidebar:
+    if st.checkbox('顯示效能資訊', key='show_performance_debug'):
+        record = run_stats.to_record()
+        st.caption(f"本次執行 {record['seconds'] * 1000:,.0f} ms（{record['started_at']}）")
+        if record['stages']:
+            show_stage_table(record['stages'])
+        if record['caches']:
+            caches = pd.DataFrame.from_dict(record['caches'], orient='index').rename_axis('快取')
+            caches = caches.assign(hit_ratio=caches['hit_ratio'] * 100)
+            st.dataframe(caches, use_container_width=True, column_config={'hits': '命中', 'misses': '未命中', 'hit_ratio': st.column_config.NumberColumn('命中率', format='%.0f%%')})
+
+        background = get_background_refresher().run_log.latest()
+        if background and background['stages']:
+            st.caption(f"背景更新最近一輪 {background['seconds'] * 1000:,.0f} ms（{background['started_at']}）")
+            show_stage_table(background['stages'])
+
+        export = get_run_log().to_jsonl() + get_background_refresher().run_log.to_jsonl()
+        st.download_button('匯出效能記錄 (JSON Lines)', export, file_name=RUN_LOG_EXPORT_NAME, mime='application/jsonl')
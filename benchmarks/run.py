@@ -0,0 +1,167 @@
+"""投資組合熱點路徑的效能測試
+
+    python -m benchmarks.run                      # 預設的所有規模
+    python -m benchmarks.run --sizes 100x10000 --repeat 5 --output bench.jsonl
+
+每個規模先產生假投資組合與回放資料 (不連網)，再分別量測各階段的執行時間與記憶體峰值。
+走勢區間以假資料的最後一天為基準，結果不隨執行日期改變。
+時間取 repeat 次中最快的一次；記憶體峰值另外以 tracemalloc 跑一次量測，避免追蹤的開銷影響計時。
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from leek_diary import (
+    HISTORY_RANGES,
+    FxRates,
+    HistoryStore,
+    PortfolioLog,
+    PositionBook,
+    ReplayProvider,
+    build_ledger,
+    create_distribution_chart,
+    create_price_history_chart,
+    create_profit_loss_chart,
+    get_current_prices,
+    load_stock_history,
+    read_portfolio_file,
+    summarize_ledger,
+    track_lots,
+    value_portfolio,
+)
+
+from .synthetic import SYNTHETIC_END, generate_portfolio, generate_prices, write_replay_directory
+
+# 預設量測的規模 (股票數, 交易筆數)
+BENCHMARK_SIZES = [(10, 10), (10, 1_000), (100, 10_000), (1_000, 100_000), (1_000, 1_000_000)]
+BENCHMARK_REPEAT = 3
+# 單次超過這個秒數的階段不再重複量測
+BENCHMARK_SLOW_SECONDS = 2.0
+
+def measure(func, repeat=BENCHMARK_REPEAT):
+    """回傳 (最快一次的秒數, tracemalloc 量到的記憶體峰值 bytes, 最後一次的回傳值)"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed)
+        if elapsed > BENCHMARK_SLOW_SECONDS:
+            break
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak, result
+
+def build_overview_figures(performance):
+    """以畫面上總覽區相同的參數建立圓餅圖與兩張長條圖"""
+    return [
+        create_distribution_chart(performance[['Symbol', 'Current Value (TWD)']]),
+        create_profit_loss_chart(performance[['Symbol', 'Total Profit/Loss (TWD)']], title='股票收益/虧損金額', value_column='Total Profit/Loss (TWD)', height=400),
+        create_profit_loss_chart(performance[['Symbol', 'Performance %']], title='股票收益率', value_column='Performance %', is_percentage=True, height=400),
+    ]
+
+def run_size(symbol_count, transaction_count, repeat, workdir):
+    """量測一個規模的所有階段，回傳每個階段一筆的結果列表"""
+    portfolio = generate_portfolio(symbol_count, transaction_count)
+    prices = generate_prices(portfolio)
+    # 個股走勢區塊選的是交易最多的股票
+    selected = max(portfolio, key=lambda stock: len(stock['Transactions']))
+    replay_dir = os.path.join(workdir, 'replay')
+    write_replay_directory(replay_dir, portfolio, prices, history_symbols=[selected['Symbol']])
+    provider = ReplayProvider(replay_dir)
+
+    legacy_path = os.path.join(workdir, 'my_portfolio.json')
+    with open(legacy_path, 'w', encoding='utf-8') as f:
+        json.dump(portfolio, f, ensure_ascii=False)
+    log = PortfolioLog(os.path.join(workdir, 'my_portfolio.jsonl'), legacy_path=legacy_path)
+    log.write(portfolio)
+
+    stocks = [(stock['Symbol'], stock['Market']) for stock in portfolio]
+    fx_rates = FxRates(path=os.path.join(workdir, 'fx_rates.json'), provider=provider)
+    fx_rates.refresh()
+    store = HistoryStore(os.path.join(workdir, 'history'), provider=provider)
+    load_stock_history(store, selected['Symbol'], selected['Market'], '5Y', now=SYNTHETIC_END)
+    performance, _ = value_portfolio(portfolio, prices, fx_rates)
+
+    def sync_position_book():
+        PositionBook().sync(portfolio)
+
+    def selected_stock_view():
+        history = load_stock_history(store, selected['Symbol'], selected['Market'], '5Y', refresh=False, now=SYNTHETIC_END)
+        ledger = build_ledger([selected])
+        position = summarize_ledger(ledger, [selected], lots=track_lots(ledger)).loc[selected['Symbol']]
+        currency = 'US$' if selected['Market'] == '美股' else 'NT$'
+        return create_price_history_chart(history, title=f"{selected['Symbol']} - {selected['Name']}", range_label=HISTORY_RANGES['5Y'], currency=currency,
+                                          average_buy_price=position['Average Buy Price'], average_sell_price=position['Average Sell Price'])
+
+    stages = [
+        ('load_json', lambda: read_portfolio_file(legacy_path), transaction_count),
+        ('load_jsonl', log.load, transaction_count),
+        ('quotes_replay', lambda: get_current_prices(stocks, provider), symbol_count),
+        ('position_book_sync', sync_position_book, transaction_count),
+        ('valuation', lambda: value_portfolio(portfolio, prices, fx_rates), transaction_count),
+        ('selected_stock_view', selected_stock_view, len(selected['Transactions'])),
+        ('overview_figures', lambda: build_overview_figures(performance), symbol_count),
+        ('save_snapshot', lambda: log.write(portfolio), transaction_count),
+        ('append_transaction', lambda: log.add_transaction(selected, selected['Transactions'][-1]), 1),
+    ]
+
+    results = []
+    for name, func, items in stages:
+        seconds, peak, _ = measure(func, repeat)
+        results.append({
+            'symbols': symbol_count,
+            'transactions': transaction_count,
+            'stage': name,
+            'seconds': seconds,
+            'items_per_second': items / seconds if seconds > 0 else None,
+            'peak_memory_bytes': peak,
+        })
+    return results
+
+def parse_sizes(text):
+    sizes = []
+    for item in text.split(','):
+        symbols, transactions = item.lower().split('x')
+        sizes.append((int(symbols), int(transactions)))
+    return sizes
+
+def format_row(result):
+    throughput = result['items_per_second']
+    return (f"{result['symbols']:>7} {result['transactions']:>10} {result['stage']:<20} "
+            f"{result['seconds'] * 1000:>10.2f} ms {throughput or 0:>14,.0f}/s {result['peak_memory_bytes'] / 2**20:>9.1f} MiB")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='以假資料量測投資組合的讀寫、估值與圖表建立')
+    parser.add_argument('--sizes', type=parse_sizes, default=BENCHMARK_SIZES, help='股票數x交易筆數，以逗號分隔，例如 10x1000,100x10000')
+    parser.add_argument('--max-transactions', type=int, help='略過交易筆數超過此值的規模')
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT, help='每個階段重複次數，取最快的一次')
+    parser.add_argument('--output', help='另外把每筆結果以 JSON Lines 寫入此檔案')
+    args = parser.parse_args(argv)
+
+    sizes = [size for size in args.sizes if args.max_transactions is None or size[1] <= args.max_transactions]
+    print(f"{'symbols':>7} {'txns':>10} {'stage':<20} {'time':>13} {'throughput':>16} {'peak memory':>13}")
+    results = []
+    for symbol_count, transaction_count in sizes:
+        with tempfile.TemporaryDirectory(prefix='leek_diary_bench_') as workdir:
+            for result in run_size(symbol_count, transaction_count, max(1, args.repeat), workdir):
+                print(format_row(result), flush=True)
+                results.append(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(result) + '\n' for result in results)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""產生效能測試用的假投資組合、報價與歷史股價
+
+所有資料都由 seed 決定，同樣的參數每次產生完全相同的內容。
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from leek_diary import to_yf_ticker
+
+# 交易日期與歷史股價的範圍；效能測試以 SYNTHETIC_END 當作現在，五年走勢區間完整落在範圍內
+SYNTHETIC_START = '2015-01-01'
+SYNTHETIC_END = '2024-12-31'
+# 台股與美股的比例
+SYNTHETIC_US_SHARE = 0.4
+SYNTHETIC_BUY_SHARE = 0.6
+
+def _letters(index, width=4):
+    letters = ''
+    for _ in range(width):
+        index, digit = divmod(index, 26)
+        letters = chr(ord('A') + digit) + letters
+    return letters
+
+def generate_symbols(count, seed=0):
+    """回傳 [(symbol, name, market)]；台股為四位數字代號，美股為四個英文字母的代號"""
+    rng = np.random.default_rng(seed)
+    is_us = rng.random(count) < SYNTHETIC_US_SHARE
+    return [
+        (_letters(index), f'US Corp {index}', '美股') if us else (f'{1000 + index}', f'台灣公司{index}', '台股')
+        for index, us in enumerate(is_us.tolist())
+    ]
+
+def generate_portfolio(symbol_count, transaction_count, seed=0):
+    """產生與 my_portfolio.json 格式相同的投資組合：transaction_count 筆交易隨機分配到 symbol_count 支股票
+
+    每支股票至少一筆交易，日期不依順序排列 (與手動補登的交易相同)。
+    """
+    if transaction_count < symbol_count:
+        raise ValueError('交易筆數不能少於股票數量')
+    rng = np.random.default_rng(seed)
+    symbols = generate_symbols(symbol_count, seed)
+
+    owners = np.concatenate([np.arange(symbol_count), rng.integers(0, symbol_count, transaction_count - symbol_count)])
+    days = pd.bdate_range(SYNTHETIC_START, SYNTHETIC_END).strftime('%Y-%m-%d').to_numpy()
+    dates = days[rng.integers(0, len(days), transaction_count)]
+    kinds = np.where(rng.random(transaction_count) < SYNTHETIC_BUY_SHARE, '買入', '賣出')
+    base_prices = rng.uniform(10, 1000, symbol_count)
+    prices = np.round(base_prices[owners] * rng.uniform(0.5, 1.5, transaction_count), 2)
+    quantities = rng.integers(1, 1000, transaction_count)
+
+    transactions = [[] for _ in range(symbol_count)]
+    for owner, date, kind, price, quantity in zip(owners.tolist(), dates.tolist(), kinds.tolist(), prices.tolist(), quantities.tolist()):
+        transactions[owner].append({'Date': date, 'Type': kind, 'Price': price, 'Quantity': quantity})
+    return [
+        {'Symbol': symbol, 'Name': name, 'Market': market, 'Transactions': stock_transactions}
+        for (symbol, name, market), stock_transactions in zip(symbols, transactions)
+    ]
+
+def generate_prices(portfolio, seed=0):
+    """回傳 symbol → 目前價格"""
+    rng = np.random.default_rng(seed + 1)
+    return {stock['Symbol']: round(float(stock['Transactions'][0]['Price'] * rng.uniform(0.7, 1.6)), 2) for stock in portfolio}
+
+def generate_history(start_price, start=SYNTHETIC_START, end=SYNTHETIC_END, seed=0, tz='Asia/Taipei'):
+    """以幾何隨機漫步產生日 K 資料，格式與 yfinance 的 history() 相同"""
+    rng = np.random.default_rng(seed + 2)
+    index = pd.bdate_range(start, end, tz=tz, name='Date')
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.015, len(index))))
+    spread = close * rng.uniform(0, 0.02, len(index))
+    return pd.DataFrame({
+        'Open': close + rng.uniform(-1, 1, len(index)) * spread,
+        'High': close + spread,
+        'Low': close - spread,
+        'Close': close,
+        'Volume': rng.integers(1_000, 10_000_000, len(index)),
+    }, index=index)
+
+def write_replay_directory(directory, portfolio, prices, history_symbols=(), seed=0):
+    """寫出 ReplayProvider 可以讀取的目錄：報價、USD 匯率表，以及 history_symbols 的歷史股價"""
+    markets = {stock['Symbol']: stock['Market'] for stock in portfolio}
+    os.makedirs(os.path.join(directory, 'fx'), exist_ok=True)
+    os.makedirs(os.path.join(directory, 'history'), exist_ok=True)
+    with open(os.path.join(directory, 'quotes.json'), 'w', encoding='utf-8') as f:
+        json.dump({to_yf_ticker(symbol, markets[symbol]): price for symbol, price in prices.items()}, f)
+    with open(os.path.join(directory, 'fx', 'USD.json'), 'w', encoding='utf-8') as f:
+        json.dump({'base': 'USD', 'rates': {'USD': 1.0, 'TWD': 31.5}}, f)
+    for symbol in history_symbols:
+        ticker = to_yf_ticker(symbol, markets[symbol])
+        tz = 'America/New_York' if markets[symbol] == '美股' else 'Asia/Taipei'
+        generate_history(prices[symbol], seed=seed, tz=tz).to_parquet(os.path.join(directory, 'history', f'{ticker}.parquet'))
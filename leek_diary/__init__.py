@@ -0,0 +1,150 @@
+"""我的韭菜日記的計算核心
+
+投資組合的讀寫、報價與匯率、歷史股價與估值都在這個套件中，不依賴 Streamlit，
+可以在排程、批次或其他程式中直接使用；app.py 只負責畫面。
+"""
+
+from .cache import FIGURE_CACHE_SIZE, FigureCache, LRUCache, frame_fingerprint
+from .charts import create_distribution_chart, create_equity_curve_chart, create_price_history_chart, create_profit_loss_chart
+from .equity import EQUITY_CACHE_DIR, EquityCurveStore, compute_equity_curve, load_closes
+from .errors import (
+    FxUnavailable,
+    HistoryUnavailable,
+    LeekDiaryError,
+    PortfolioFileError,
+    QuoteUnavailable,
+    SymbolLookupError,
+    SymbolNotFound,
+)
+from .fx import FX_CACHE_TTL, FxRates
+from .history import (
+    CHART_MAX_POINTS,
+    HISTORY_CACHE_DIR,
+    HISTORY_RANGES,
+    MOVING_AVERAGE_WINDOWS,
+    HistoryStore,
+    add_rolling_indicators,
+    align_timestamp,
+    downsample_history,
+    fetch_histories,
+    history_range_start,
+    load_stock_history,
+    lttb_indices,
+)
+from .ledger import (
+    LEDGER_COLUMNS,
+    POSITION_COLUMNS,
+    PositionBook,
+    build_ledger,
+    calculate_performance,
+    summarize_ledger,
+    value_portfolio,
+)
+from .instrumentation import RUN_LOG_EXPORT_NAME, RUN_LOG_PATH_ENV, RunLog, RunStats, begin_run, cache_lookup, collect, end_run, timed
+from .lots import COST_METHODS, DEFAULT_COST_METHOD, LotTracker, track_lots
+from .markets import MARKET_CURRENCIES, MARKET_SESSIONS, TW_EXCHANGE_SUFFIXES, is_market_open, last_market_close, register_exchanges, to_yf_ticker
+from .providers import MarketDataProvider, RecordingProvider, ReplayProvider, SchedulingProvider, YFinanceProvider, default_provider
+from .quotes import QUOTE_CACHE_MAX_SIZE, QUOTE_CACHE_TTL, QuoteCache, get_current_prices
+from .refresher import BackgroundRefresher
+from .scheduler import FETCH_BURST, FETCH_MAX_RETRIES, FETCH_RATE_LIMIT, FetchScheduler, TokenBucket
+from .storage import PORTFOLIO_LOG_PATH, PORTFOLIO_PATH, PortfolioLog, PortfolioWatcher, is_valid_stock, read_portfolio_file, replay_portfolio_log
+from .symbols import (
+    SYMBOL_DIRECTORY_BUNDLED_PATH,
+    SYMBOL_DIRECTORY_PATH,
+    StockInfoResolver,
+    SymbolDirectory,
+    load_symbol_directory,
+    refresh_symbol_directory,
+)
+
+__all__ = [
+    'BackgroundRefresher',
+    'CHART_MAX_POINTS',
+    'COST_METHODS',
+    'DEFAULT_COST_METHOD',
+    'EQUITY_CACHE_DIR',
+    'EquityCurveStore',
+    'FETCH_BURST',
+    'FETCH_MAX_RETRIES',
+    'FETCH_RATE_LIMIT',
+    'FIGURE_CACHE_SIZE',
+    'FX_CACHE_TTL',
+    'FetchScheduler',
+    'FigureCache',
+    'FxRates',
+    'FxUnavailable',
+    'HISTORY_CACHE_DIR',
+    'HISTORY_RANGES',
+    'HistoryStore',
+    'HistoryUnavailable',
+    'LEDGER_COLUMNS',
+    'LRUCache',
+    'LeekDiaryError',
+    'LotTracker',
+    'MarketDataProvider',
+    'MARKET_CURRENCIES',
+    'MARKET_SESSIONS',
+    'MOVING_AVERAGE_WINDOWS',
+    'PORTFOLIO_LOG_PATH',
+    'PORTFOLIO_PATH',
+    'POSITION_COLUMNS',
+    'PortfolioFileError',
+    'PortfolioLog',
+    'PortfolioWatcher',
+    'PositionBook',
+    'RUN_LOG_EXPORT_NAME',
+    'RUN_LOG_PATH_ENV',
+    'QUOTE_CACHE_MAX_SIZE',
+    'QUOTE_CACHE_TTL',
+    'QuoteCache',
+    'QuoteUnavailable',
+    'RecordingProvider',
+    'ReplayProvider',
+    'RunLog',
+    'RunStats',
+    'SYMBOL_DIRECTORY_BUNDLED_PATH',
+    'SYMBOL_DIRECTORY_PATH',
+    'SchedulingProvider',
+    'StockInfoResolver',
+    'SymbolDirectory',
+    'SymbolLookupError',
+    'SymbolNotFound',
+    'TW_EXCHANGE_SUFFIXES',
+    'TokenBucket',
+    'YFinanceProvider',
+    'add_rolling_indicators',
+    'begin_run',
+    'align_timestamp',
+    'build_ledger',
+    'cache_lookup',
+    'collect',
+    'calculate_performance',
+    'compute_equity_curve',
+    'create_distribution_chart',
+    'create_equity_curve_chart',
+    'create_price_history_chart',
+    'create_profit_loss_chart',
+    'default_provider',
+    'downsample_history',
+    'end_run',
+    'fetch_histories',
+    'frame_fingerprint',
+    'get_current_prices',
+    'history_range_start',
+    'is_market_open',
+    'is_valid_stock',
+    'last_market_close',
+    'load_closes',
+    'load_stock_history',
+    'load_symbol_directory',
+    'lttb_indices',
+    'read_portfolio_file',
+    'refresh_symbol_directory',
+    'register_exchanges',
+    'replay_portfolio_log',
+    'summarize_ledger',
+    'timed',
+    'to_yf_ticker',
+    'track_lots',
+    'value_portfolio',
+]
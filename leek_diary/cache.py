@@ -0,0 +1,69 @@
+"""執行緒安全的 LRU 快取與圖表快取"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .instrumentation import cache_lookup, timed
+
+class LRUCache:
+    """執行緒安全、容量有限的 LRU 快取"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+# 圖表快取最多保留的圖表數量
+FIGURE_CACHE_SIZE = 32
+
+def frame_fingerprint(frame):
+    """以資料內容、索引、欄位名稱與型別計算 DataFrame 的雜湊值"""
+    digest = hashlib.blake2b(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes(), digest_size=16)
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in frame.dtypes.items()]).encode('utf-8'))
+    return digest.hexdigest()
+
+class FigureCache:
+    """以 (圖表函式, 資料雜湊, 參數) 為鍵的圖表 LRU 快取
+
+    快取中的圖表會被多次使用，取出後不可再修改。
+    """
+
+    def __init__(self, max_size=FIGURE_CACHE_SIZE):
+        self._figures = LRUCache(max_size)
+
+    def get_or_build(self, key, build):
+        fig = self._figures.get(key)
+        cache_lookup('figure', fig is not None)
+        if fig is None:
+            with timed('plotly.figure'):
+                fig = build()
+            self._figures.set(key, fig)
+        return fig
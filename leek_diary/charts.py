@@ -0,0 +1,340 @@
+"""總覽、個股走勢與每日總值的 Plotly 圖表
+
+只依資料建立圖表、不依賴 Streamlit，畫面與效能測試共用同一份程式。
+"""
+
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from .history import MOVING_AVERAGE_WINDOWS, downsample_history
+
+tech_color_scheme = [
+    '#007AFF',  # 藍色
+    '#5856D6',  # 紫色
+    '#FF9500',  # 橙色
+    '#FFCC00',  # 黃色
+    '#00C7BE',  # 青色
+    '#AF52DE',  # 淺紫色
+    '#8E8E93',  # 灰色
+    '#FF2D55',  # 珊瑚紅
+    '#64D2FF',  # 天藍色
+    '#5AC8FA'   # 淺藍色
+]
+
+def create_distribution_chart(performance):
+    fig_distribution = px.pie(
+        performance, 
+        values='Current Value (TWD)', 
+        names='Symbol', 
+        title='投資金額占比',
+        color_discrete_sequence=tech_color_scheme,
+        hole=0.4
+    )
+    fig_distribution.update_traces(textposition='inside', textinfo='percent+label')
+    fig_distribution.update_layout(
+        height=400, 
+        margin=dict(l=20, r=20, t=40, b=20),
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='#333333'),
+        title_font_size=18,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=-0.1,
+            xanchor="center",
+            x=0.5
+        )
+    )
+    return fig_distribution
+
+def create_profit_loss_chart(data, title, value_column='Profit/Loss', is_percentage=False, height=None):
+    data_sorted = data.sort_values(value_column, ascending=True)
+    
+    colors = ['#34C759' if x < 0 else '#FF3B30' for x in data_sorted[value_column]]
+    
+    fig = go.Figure(go.Bar(
+        x=data_sorted['Symbol'],
+        y=data_sorted[value_column],
+        marker_color=colors,
+        text=data_sorted[value_column].apply(lambda x: f'{x:.2f}%' if is_percentage else f'${x:,.2f}'),
+        textposition='outside',
+        textfont=dict(size=10, color='#333333'),
+    ))
+    
+    fig.update_layout(
+        title=dict(
+            text=title,
+            font=dict(size=18, color='#333333')
+        ),
+        xaxis_title='股票代號',
+        yaxis_title='收益率 (%)' if is_percentage else '收益/虧損',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='#333333'),
+        yaxis=dict(zeroline=True, zerolinewidth=1, zerolinecolor='#333333', gridcolor='#E0E0E0'),
+        xaxis=dict(gridcolor='#E0E0E0'),
+        margin=dict(l=20, r=20, t=40, b=20, pad=4),
+        uniformtext_minsize=8,
+        uniformtext_mode='hide',
+        bargap=0.2
+    )
+    
+    fig.update_xaxes(type='category', tickangle=45)
+    fig.update_yaxes(automargin=True)
+    
+    y_max = max(abs(data_sorted[value_column].min()), abs(data_sorted[value_column].max()))
+    fig.update_yaxes(range=[-y_max*1.15, y_max*1.15])
+
+    if height is not None:
+        fig.update_layout(height=height)
+    
+    return fig
+
+def create_price_history_chart(history, title, range_label, currency, average_buy_price, average_sell_price):
+    # 長區間的資料先降採樣，讓傳到瀏覽器的點數固定
+    sampled, volume = downsample_history(history)
+    period_average = history['Close'].mean()
+
+    # 創建子圖
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.1, row_heights=[0.7, 0.3])
+
+    # 添加價格線
+    fig.add_trace(go.Scatter(
+        x=sampled.index, 
+        y=sampled['Close'], 
+        mode='lines', 
+        name='收盤價',
+        line=dict(color=tech_color_scheme[2], width=2)
+    ), row=1, col=1)
+
+    # 添加移動平均線
+    for window, color in zip(MOVING_AVERAGE_WINDOWS, (tech_color_scheme[0], tech_color_scheme[8])):
+        fig.add_trace(go.Scatter(
+            x=sampled.index,
+            y=sampled[f'MA{window}'],
+            mode='lines',
+            name=f'{window}日均線',
+            line=dict(color=color, width=1)
+        ), row=1, col=1)
+
+    # 添加平均買入價格線
+    fig.add_trace(go.Scatter(
+        x=[history.index[0], history.index[-1]],
+        y=[average_buy_price, average_buy_price],
+        mode='lines',
+        name='平均買入價格',
+        line=dict(color=tech_color_scheme[3], dash='dash', width=3)
+    ), row=1, col=1)
+
+    # 添加區間均價線
+    fig.add_trace(go.Scatter(
+        x=[history.index[0], history.index[-1]],
+        y=[period_average, period_average],
+        mode='lines',
+        name='區間均價',
+        line=dict(color=tech_color_scheme[4], dash='dot', width=3)
+    ), row=1, col=1)
+
+    # 添加最高價和最低價標記
+    highest_price = history['Close'].max()
+    lowest_price = history['Close'].min()
+    highest_date = history['Close'].idxmax()
+    lowest_date = history['Close'].idxmin()
+
+    fig.add_trace(go.Scatter(
+        x=[highest_date],
+        y=[highest_price],
+        mode='markers+text',
+        name='最高價',
+        text=[f'${highest_price:.2f}'],
+        textposition='top center',
+        marker=dict(color=tech_color_scheme[6], size=10, symbol='triangle-up'),
+        showlegend=False
+    ), row=1, col=1)
+
+    fig.add_trace(go.Scatter(
+        x=[lowest_date],
+        y=[lowest_price],
+        mode='markers+text',
+        name='最低價',
+        text=[f'${lowest_price:.2f}'],
+        textposition='bottom center',
+        marker=dict(color=tech_color_scheme[1], size=10, symbol='triangle-down'),
+        showlegend=False
+    ), row=1, col=1)
+
+    # 添加成交量圖
+    fig.add_trace(go.Bar(
+        x=volume.index,
+        y=volume,
+        name='成交量',
+        marker_color=tech_color_scheme[3],
+        opacity=0.7
+    ), row=2, col=1)
+
+    # 調整y軸範圍
+    y_min = min(history['Close'].min(), average_buy_price, period_average)
+    y_max = max(history['Close'].max(), average_buy_price, period_average)
+    y_range = y_max - y_min
+    y_padding = y_range * 0.15  # 增加15%的空間
+
+    fig.update_layout(
+        title=f"{title} {range_label}走勢與成交量",
+        autosize=True,
+        margin=dict(l=20, r=20, t=40, b=20),  # 調整邊距
+        height=500,
+        plot_bgcolor='rgba(255,255,255,0)',  # 保持繪圖區域透明
+        paper_bgcolor='rgba(255,255,255,0.8)',  # 設置輕微的背景色
+        font=dict(color='black'),
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=-0.3,
+            xanchor="center",
+            x=0.5,
+            bgcolor="rgba(255,255,255,0.5)",  # 半透明背景
+            bordercolor="rgba(0,0,0,0)",      # 移除邊框
+            borderwidth=0
+        ),
+        yaxis=dict(range=[y_min - y_padding, y_max + y_padding])  # 設置新的y軸範圍
+    )
+
+    # 添加一個不可見的邊框來創造圓角效果
+    fig.update_layout(
+        shapes=[
+            dict(
+                type="rect",
+                xref="paper",
+                yref="paper",
+                x0=0,
+                y0=0,
+                x1=1,
+                y1=1,
+                line=dict(
+                    color="rgba(255,255,255,0)",
+                    width=0,
+                ),
+                fillcolor="rgba(255,255,255,0.8)",
+                layer="below"
+            )
+        ]
+    )
+
+    # 更新子圖的標題和軸標籤
+    fig.update_xaxes(title_text="日期", row=2, col=1)
+    fig.update_yaxes(title_text="價格", row=1, col=1)
+    fig.update_yaxes(title_text="成交量", row=2, col=1)
+
+    # 更新 x 軸和 y 軸的外觀
+    fig.update_xaxes(
+        showline=True,
+        linewidth=1,
+        linecolor='lightgray',
+        mirror=True
+    )
+    fig.update_yaxes(
+        showline=True,
+        linewidth=1,
+        linecolor='lightgray',
+        mirror=True
+    )
+
+    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
+    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor='lightgray')
+
+    # 添加註釋來標記平均買入價格和區間均價
+    fig.add_annotation(
+        x=history.index[-1],
+        y=average_buy_price,
+        text=f"平均買入價格: {currency}{average_buy_price:.2f}",
+        showarrow=True,
+        arrowhead=2,
+        arrowsize=1,
+        arrowwidth=2,
+        arrowcolor=tech_color_scheme[3],
+        ax=50,
+        ay=-30,
+        row=1, col=1
+    )
+    fig.add_annotation(
+        x=history.index[-1],
+        y=period_average,
+        text=f"區間均價: {currency}{period_average:.2f}",
+        showarrow=True,
+        arrowhead=2,
+        arrowsize=1,
+        arrowwidth=2,
+        arrowcolor=tech_color_scheme[4],
+        ax=50,
+        ay=30,
+        row=1, col=1
+    )
+
+    # 添加平均賣出價格線
+    if average_sell_price > 0:
+        fig.add_trace(go.Scatter(
+            x=[history.index[0], history.index[-1]],
+            y=[average_sell_price, average_sell_price],
+            mode='lines',
+            name='平均賣出價格',
+            line=dict(color=tech_color_scheme[5], dash='dash', width=3)
+        ), row=1, col=1)
+
+        # 動態調整註釋位置
+        prices = [average_buy_price, period_average, average_sell_price]
+        prices.sort()
+        sell_price_index = prices.index(average_sell_price)
+
+        if sell_price_index == 0:  # 最低
+            annotation_ax = 50
+            annotation_ay = 30
+        elif sell_price_index == 1:  # 中間
+            annotation_ax = -50
+            annotation_ay = -60 if average_sell_price > prices[0] + (prices[2] - prices[0]) / 2 else 60
+        else:  # 最高
+            annotation_ax = -50
+            annotation_ay = -30
+
+        fig.add_annotation(
+            x=history.index[-9],
+            y=average_sell_price,
+            text=f"平均賣出價格: {currency}{average_sell_price:.2f}",
+            showarrow=True,
+            arrowhead=2,
+            arrowsize=1,
+            arrowwidth=2,
+            arrowcolor=tech_color_scheme[5],
+            ax=annotation_ax,
+            ay=annotation_ay,
+            row=1, col=1
+        )
+
+    return fig
+
+def create_equity_curve_chart(curve):
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=curve.index, y=curve['Value (TWD)'], mode='lines', name='總價值',
+                             line=dict(color=tech_color_scheme[0], width=2),
+                             hovertemplate='%{x|%Y-%m-%d}<br>總價值: NT$%{y:,.0f}<extra></extra>'))
+    fig.add_trace(go.Scatter(x=curve.index, y=curve['Net Invested (TWD)'], mode='lines', name='投入成本',
+                             line=dict(color=tech_color_scheme[6], width=1.5, dash='dash'),
+                             hovertemplate='%{x|%Y-%m-%d}<br>投入成本: NT$%{y:,.0f}<extra></extra>'))
+
+    fig.update_layout(
+        title=dict(
+            text='投資組合總價值走勢',
+            font=dict(size=18, color='#333333')
+        ),
+        yaxis_title='台幣價值',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(color='#333333'),
+        yaxis=dict(gridcolor='#E0E0E0', tickformat=',.0f'),
+        xaxis=dict(gridcolor='#E0E0E0'),
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        hovermode='x unified',
+        margin=dict(l=20, r=20, t=40, b=20, pad=4),
+    )
+    return fig
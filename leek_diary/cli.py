@@ -0,0 +1,133 @@
+"""批次估值的命令列介面
+
+    python -m leek_diary my_portfolio.jsonl other.json -o snapshot.parquet
+    python -m leek_diary accounts/*.jsonl --prices prices.csv --format json
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+from .errors import PortfolioFileError
+from .fx import FX_CACHE_PATH, FxRates
+from .ledger import value_portfolio
+from .lots import COST_METHODS, DEFAULT_COST_METHOD
+from .quotes import QuoteCache, get_current_prices
+from .storage import PORTFOLIO_LOG_PATH, read_portfolio_file
+from .symbols import load_symbol_directory
+
+OUTPUT_FORMATS = ('csv', 'json', 'parquet')
+# 同時讀取與估值的投資組合檔案數量
+CLI_WORKERS = 4
+
+def load_price_file(path):
+    """讀取離線報價檔，回傳 symbol → price
+
+    支援有 Symbol、Price 兩欄的 CSV，或 {"symbol": price} 格式的 JSON。
+    """
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            return {str(symbol): float(price) for symbol, price in json.load(f).items()}
+    prices = pd.read_csv(path, dtype={'Symbol': str})
+    return dict(zip(prices['Symbol'], prices['Price'].astype('float64')))
+
+def offline_price_fetcher(prices):
+    """回傳與 get_current_prices 介面相同、只查詢 prices 字典的函式"""
+    def fetch(stocks):
+        found = {symbol: prices[symbol] for symbol, _ in stocks if symbol in prices}
+        return found, [symbol for symbol, _ in stocks if symbol not in prices]
+    return fetch
+
+def value_portfolio_files(paths, quote_cache, fx_rates, workers=CLI_WORKERS, cost_method=DEFAULT_COST_METHOD):
+    """讀取並估值多個投資組合檔案，回傳 (合併的估值結果, [(檔案路徑, 錯誤)])
+
+    所有檔案的股票先合併成一次報價查詢，多個投資組合持有相同股票時只會查詢一次。
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        loaded = list(executor.map(read_portfolio_file, paths))
+        errors = [(path, error) for path, (_, load_errors) in zip(paths, loaded) for error in load_errors]
+
+        stocks = list(dict.fromkeys((stock['Symbol'], stock['Market']) for portfolio, _ in loaded for stock in portfolio))
+        quote_cache.refresh(stocks)
+        prices = {symbol: price for symbol, (price, _) in quote_cache.snapshot(stocks).items()}
+        # 先載入匯率表，之後各執行緒只讀取
+        fx_rates.table()
+
+        valued_at = datetime.now().isoformat(timespec='seconds')
+        def value(path, portfolio):
+            performance, valuation_errors = value_portfolio(portfolio, prices, fx_rates, cost_method)
+            return performance.assign(Portfolio=path, **{'Valued At': valued_at}), valuation_errors
+
+        frames = []
+        for path, (performance, valuation_errors) in zip(paths, executor.map(value, paths, [portfolio for portfolio, _ in loaded])):
+            frames.append(performance)
+            errors.extend((path, error) for error in valuation_errors)
+
+    snapshot = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    leading = [column for column in ('Portfolio', 'Valued At') if column in snapshot.columns]
+    return snapshot[leading + [column for column in snapshot.columns if column not in leading]], errors
+
+def write_snapshot(snapshot, output, output_format):
+    if output_format == 'parquet':
+        if output == '-':
+            raise ValueError('Parquet 格式必須以 --output 指定檔案')
+        snapshot.to_parquet(output, index=False)
+    elif output_format == 'json':
+        text = snapshot.to_json(orient='records', force_ascii=False, indent=2)
+        if output == '-':
+            sys.stdout.write(text + '\n')
+        else:
+            with open(output, 'w', encoding='utf-8') as f:
+                f.write(text)
+    else:
+        snapshot.to_csv(sys.stdout if output == '-' else output, index=False)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m leek_diary', description='批次估值一個或多個投資組合檔案')
+    parser.add_argument('portfolios', nargs='*', default=[PORTFOLIO_LOG_PATH], help='投資組合檔案 (.jsonl 交易記錄或舊版 .json)')
+    parser.add_argument('-o', '--output', default='-', help='輸出檔案，預設輸出到 stdout')
+    parser.add_argument('-f', '--format', choices=OUTPUT_FORMATS, help='輸出格式，預設依副檔名判斷，否則為 csv')
+    parser.add_argument('--prices', help='離線模式：從 CSV (Symbol, Price) 或 JSON 報價檔讀取價格，不連網')
+    parser.add_argument('--fx-cache', default=FX_CACHE_PATH, help='匯率表快取檔，離線模式時直接使用')
+    parser.add_argument('--allow-default-fx', action='store_true', help='沒有可用的匯率表時仍以內建的預設匯率估值並以狀態碼 0 結束')
+    parser.add_argument('--cost-method', choices=list(COST_METHODS), default=DEFAULT_COST_METHOD, help='已實現損益的成本計算方式：fifo (先進先出) 或 average (移動平均)')
+    parser.add_argument('-j', '--workers', type=int, default=CLI_WORKERS, help='同時處理的投資組合數量')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    output_format = args.format or os.path.splitext(args.output)[1].lstrip('.').lower()
+    if output_format not in OUTPUT_FORMATS:
+        output_format = 'csv'
+
+    offline = args.prices is not None
+    fetcher = offline_price_fetcher(load_price_file(args.prices)) if offline else get_current_prices
+    fx_rates = FxRates(path=args.fx_cache, offline=offline)
+    if not offline:
+        # 載入代號目錄以登記上櫃股票，報價才會以 .TWO 查詢
+        load_symbol_directory()
+        fx_rates.refresh()
+
+    snapshot, errors = value_portfolio_files(args.portfolios, QuoteCache(fetcher), fx_rates, workers=max(1, args.workers), cost_method=args.cost_method)
+    for path, error in errors:
+        print(f"{path}: {error}", file=sys.stderr)
+    if fx_rates.error:
+        print(f"匯率: {fx_rates.error}", file=sys.stderr)
+    default_fx = fx_rates.table()['source'] == 'fallback'
+    if default_fx:
+        print(f"匯率: 沒有可用的匯率表 ({args.fx_cache})，美股以內建的預設匯率估值", file=sys.stderr)
+
+    try:
+        write_snapshot(snapshot, args.output, output_format)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    # 有檔案無法讀取，或只能使用預設匯率時以非零狀態結束，讓排程工作可以察覺
+    if any(isinstance(error, PortfolioFileError) for _, error in errors):
+        return 1
+    return 1 if default_fx and not args.allow_default_fx else 0
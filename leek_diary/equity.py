@@ -0,0 +1,157 @@
+"""每日投資組合總值序列 (equity curve)"""
+
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from .cache import frame_fingerprint
+from .instrumentation import timed
+from .markets import MARKET_CURRENCIES, to_yf_ticker
+
+# 每日總值序列的本地存放目錄
+EQUITY_CACHE_DIR = os.path.join('.cache', 'equity')
+EQUITY_COLUMNS = ['Value (TWD)', 'Net Invested (TWD)']
+
+def _empty_curve():
+    return pd.DataFrame(columns=EQUITY_COLUMNS, index=pd.DatetimeIndex([], name='Date'), dtype='float64')
+
+def load_closes(store, stocks):
+    """從本地歷史資料庫讀取收盤價 (不連網)，回傳以當地日期為索引、每支股票一欄的 DataFrame"""
+    closes = {}
+    for symbol, market in stocks:
+        history = store.load(to_yf_ticker(symbol, market))
+        if history is None or history.empty:
+            continue
+        close = history['Close']
+        closes[symbol] = close.set_axis(close.index.tz_localize(None).normalize())
+    return pd.DataFrame(closes).sort_index()
+
+def _daily_cumulative(flows, column, dates):
+    """把每筆交易的變動量彙總成每日累計值；dates 之前與非交易日的交易併入下一個日期"""
+    daily = flows.pivot_table(index='Date', columns='Symbol', values=column, aggfunc='sum', observed=True)
+    return daily.reindex(daily.index.union(dates), fill_value=0.0).fillna(0.0).cumsum().reindex(dates)
+
+def _ledger_flows(ledger):
+    signed_quantity = ledger['Quantity'].where(ledger['Type'] == '買入', -ledger['Quantity'])
+    return pd.DataFrame({
+        'Date': ledger['Date'].dt.normalize(),
+        'Symbol': ledger['Symbol'].astype('str'),
+        'Quantity': signed_quantity,
+        'Cash': ledger['Price'] * signed_quantity,
+    })
+
+def _priced_dates(ledger, closes, dates):
+    """回傳 dates 中可以估值的連續區段：每天持有中的股票都要有當天或之前、以及當天或之後的收盤價
+
+    從第一個可以估值的日期開始，到下一個無法估值的日期為止；已出清的股票不影響。
+    """
+    quantity = _daily_cumulative(_ledger_flows(ledger), 'Quantity', dates)
+    prices = closes.reindex(columns=quantity.columns)
+    first_close = prices.apply(lambda close: close.first_valid_index()).to_numpy(dtype='datetime64[ns]')
+    last_close = prices.apply(lambda close: close.last_valid_index()).to_numpy(dtype='datetime64[ns]')
+    held = quantity.abs().to_numpy() > 1e-9
+    days = dates.to_numpy()[:, None]
+    priced = (~held | ((first_close[None, :] <= days) & (days <= last_close[None, :]))).all(axis=1)
+    if not priced.any():
+        return dates[:0]
+    start = priced.argmax()
+    gaps = ~priced[start:]
+    return dates[start:start + (gaps.argmax() if gaps.any() else len(gaps))]
+
+def compute_equity_curve(ledger, markets, closes, fx_rates, dates):
+    """以帳本與收盤價一次算出 dates 每天的總值與累計投入成本 (台幣)
+
+    持股數量與投入成本都是 (日期 × 股票) 的累計矩陣，乘上向前補值的收盤價與匯率後逐列加總。
+    dates 中持有中的股票都要有當天或之前的收盤價；匯率使用目前的匯率表。
+    """
+    flows = _ledger_flows(ledger)
+    quantity = _daily_cumulative(flows, 'Quantity', dates)
+    invested = _daily_cumulative(flows, 'Cash', dates)
+
+    symbols = quantity.columns
+    rates = {market: fx_rates.rate(MARKET_CURRENCIES.get(market, 'TWD'), 'TWD') for market in markets.reindex(symbols).unique()}
+    to_twd_rate = markets.reindex(symbols).map(rates).astype('float64').to_numpy()
+    prices = closes.reindex(columns=symbols)
+    prices = prices.reindex(prices.index.union(dates)).ffill().reindex(dates)
+
+    return pd.DataFrame({
+        'Value (TWD)': (quantity * prices * to_twd_rate).sum(axis=1),
+        'Net Invested (TWD)': (invested * to_twd_rate).sum(axis=1),
+    }).rename_axis('Date')
+
+class EquityCurveStore:
+    """每個投資組合一個 CSV 檔的每日總值序列
+
+    每天只追加新完成的交易日，已存的日期不再重算；帳本有變動 (指紋不同)，
+    或已存區間的收盤價改變 (除權息、分割後重新還原) 時才整段重算。
+    追加的日期以當時的匯率計算，因此舊資料大致反映當時的匯率。
+    本地完全沒有收盤價的股票不計入總值並回報給呼叫端；之後補到資料時整段重算。
+    """
+
+    def __init__(self, directory=EQUITY_CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, f"{name}.csv")
+
+    def _meta_path(self, name):
+        return os.path.join(self.directory, f"{name}.json")
+
+    def load(self, name):
+        try:
+            return pd.read_csv(self._path(name), index_col='Date', parse_dates=['Date'])
+        except (OSError, ValueError):
+            return None
+
+    def _read_meta(self, name):
+        try:
+            with open(self._meta_path(name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, name, meta):
+        with open(self._meta_path(name), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @timed('equity.update')
+    def update(self, name, ledger, markets, closes, fx_rates, today=None):
+        """補上最後一筆之後到昨天為止、持有中的股票都已有收盤價的交易日
+
+        回傳 (完整序列, 本地沒有任何收盤價而不計入總值的股票列表)。
+        """
+        symbols = ledger['Symbol'].astype('str')
+        missing = sorted(symbol for symbol in symbols.unique() if symbol not in closes.columns or closes[symbol].last_valid_index() is None)
+        ledger = ledger[~symbols.isin(missing)]
+        fingerprint = frame_fingerprint(ledger)
+        meta = self._read_meta(name)
+        stored = self.load(name) if meta.get('ledger') == fingerprint and meta.get('missing', []) == missing else None
+        if ledger.empty:
+            return _empty_curve(), missing
+        closes = closes.reindex(columns=sorted(ledger['Symbol'].astype('str').unique()))
+        if stored is not None and not stored.empty and meta.get('closes') != frame_fingerprint(closes.loc[:stored.index.max()]):
+            stored = None
+
+        # 只存已經收盤的交易日，而且持有中的股票在當天前後都要有收盤價，以免把過期或推測的價格寫死
+        end = pd.Timestamp(today or datetime.now()).normalize() - pd.Timedelta(days=1)
+        first_date = ledger['Date'].min().normalize()
+        start = first_date if stored is None or stored.empty else stored.index.max() + pd.Timedelta(days=1)
+        dates = _priced_dates(ledger, closes, pd.bdate_range(start, end, name='Date'))
+        if dates.empty:
+            return (stored if stored is not None else _empty_curve()), missing
+
+        rows = compute_equity_curve(ledger, markets, closes, fx_rates, dates)
+        os.makedirs(self.directory, exist_ok=True)
+        if stored is None:
+            tmp_path = f"{self._path(name)}.tmp"
+            rows.to_csv(tmp_path)
+            os.replace(tmp_path, self._path(name))
+        else:
+            with open(self._path(name), 'a', encoding='utf-8', newline='') as f:
+                rows.to_csv(f, header=False)
+            rows = pd.concat([stored, rows])
+        self._write_meta(name, {'ledger': fingerprint, 'missing': missing, 'closes': frame_fingerprint(closes.loc[:dates[-1]])})
+        return rows, missing
+
@@ -0,0 +1,54 @@
+"""各模組回報給呼叫端的錯誤
+
+所有錯誤都繼承 LeekDiaryError，str() 就是可以直接顯示給使用者的訊息，
+其餘屬性讓程式可以判斷是哪支股票、哪個檔案出了問題。
+"""
+
+class LeekDiaryError(Exception):
+    pass
+
+class PortfolioFileError(LeekDiaryError):
+    """投資組合檔案 (或其中幾行) 無法解析"""
+
+    def __init__(self, message, path, line_numbers=()):
+        super().__init__(message)
+        self.path = path
+        self.line_numbers = list(line_numbers)
+
+class QuoteUnavailable(LeekDiaryError):
+    """部分股票取不到報價"""
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        super().__init__(f"無法獲取以下股票的當前價格：{', '.join(self.symbols)}")
+
+class FxUnavailable(LeekDiaryError):
+    """匯率無法更新；source 為目前使用的匯率表來源 ('disk' 或 'fallback')"""
+
+    def __init__(self, reason, source):
+        super().__init__(reason)
+        self.reason = reason
+        self.source = source
+
+class HistoryUnavailable(LeekDiaryError):
+    """取不到某支股票的歷史資料"""
+
+    def __init__(self, symbol, reason):
+        super().__init__(f"無法獲取 {symbol} 的歷史數據：{reason}")
+        self.symbol = symbol
+        self.reason = reason
+
+class SymbolNotFound(LeekDiaryError):
+    """台股與美股都查不到這個代號"""
+
+    def __init__(self, symbol):
+        super().__init__(f"找不到股票代號 '{symbol}' 的資訊。請確認股票代號是否正確。")
+        self.symbol = symbol
+
+class SymbolLookupError(LeekDiaryError):
+    """查詢股票代號時發生網路或其他錯誤"""
+
+    def __init__(self, symbol, reason):
+        super().__init__(f"查詢股票資訊時發生{reason}")
+        self.symbol = symbol
+        self.reason = reason
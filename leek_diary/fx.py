@@ -0,0 +1,117 @@
+"""匯率表的抓取、快取與離線備份"""
+
+import json
+import os
+import threading
+import time
+
+from .errors import FxUnavailable
+from .providers import default_provider
+
+# 匯率表快取時間、請求逾時、失敗後重試間隔 (秒)，以及離線時使用的最後一次成功匯率表
+FX_CACHE_TTL = 60 * 60
+FX_REQUEST_TIMEOUT = 5
+FX_RETRY_INTERVAL = 60
+FX_CACHE_PATH = os.path.join('.cache', 'fx_rates.json')
+# 網路與本地備份都無法使用時的預設匯率 (以 USD 為基準)
+FX_FALLBACK_RATES = {'USD': 1.0, 'TWD': 30.0}
+
+class FxRates:
+    """一次抓取完整匯率表的匯率服務
+
+    匯率表在記憶體中快取 FX_CACHE_TTL 秒，每次成功抓取後都會寫入磁碟，
+    之後網路無法連線時就使用這份最後一次成功的匯率表。
+    table() 只在完全沒有匯率表時才會連網，過期的匯率表由 refresh() 更新。
+    offline=True 時完全不連網，只使用磁碟上的匯率表或預設匯率。
+    """
+
+    def __init__(self, base='USD', ttl=FX_CACHE_TTL, path=FX_CACHE_PATH, timeout=FX_REQUEST_TIMEOUT, offline=False, provider=None):
+        self.base = base
+        self.provider = provider or default_provider()
+        self.ttl = ttl
+        self.path = path
+        self.timeout = timeout
+        self.offline = offline
+        # 最近一次更新失敗的原因 (FxUnavailable)，成功後清除
+        self.error = None
+        self._table = None
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    def table(self):
+        """回傳 {'base', 'rates', 'fetched_at', 'source'}，第一次使用且磁碟上沒有備份時才會抓取"""
+        with self._lock:
+            if self._table is None:
+                self._table = self._load_from_disk()
+            table = self._table
+        if table is None:
+            self.refresh()
+            # 其他執行緒正在進行第一次抓取時，先用預設匯率
+            table = self._table or self._fallback_table()
+        return table
+
+    def refresh(self):
+        """匯率表過期時重新抓取；網路請求不佔用鎖，抓取期間 table() 仍回傳舊的匯率表"""
+        now = time.time()
+        with self._lock:
+            if self._table is None:
+                self._table = self._load_from_disk()
+            if self.offline:
+                if self._table is None:
+                    self._table = self._fallback_table()
+                return
+            expired = self._table is None or self._table['source'] == 'fallback' or now - self._table['fetched_at'] >= self.ttl
+            if not expired or now < self._retry_at:
+                return
+            # 先設定下次重試時間，避免多個執行緒同時抓取
+            self._retry_at = now + FX_RETRY_INTERVAL
+        try:
+            table = self._fetch()
+        except Exception as e:
+            with self._lock:
+                if self._table is None:
+                    self._table = self._fallback_table()
+                self.error = FxUnavailable(str(e), self._table['source'])
+            return
+        with self._lock:
+            self._table = table
+            self.error = None
+            self._retry_at = 0
+        try:
+            self._save_to_disk(table)
+        except OSError:
+            # 備份寫不進去 (唯讀或空間不足) 時仍使用剛抓到的匯率表，只是離線時沒有這份備份
+            pass
+
+    def rate(self, from_currency, to_currency):
+        if from_currency == to_currency:
+            return 1.0
+        table = self.table()
+        rates = dict(table['rates'])
+        rates[table['base']] = 1.0
+        return rates[to_currency] / rates[from_currency]
+
+    def _fetch(self):
+        data = self.provider.fx_rates(self.base, self.timeout)
+        return {'base': data['base'], 'rates': data['rates'], 'fetched_at': time.time(), 'source': 'live'}
+
+    def _fallback_table(self):
+        return {'base': 'USD', 'rates': dict(FX_FALLBACK_RATES), 'fetched_at': time.time(), 'source': 'fallback'}
+
+    def _load_from_disk(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+            table['source'] = 'disk'
+            return table
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save_to_disk(self, table):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({key: table[key] for key in ('base', 'rates', 'fetched_at')}, f)
+        os.replace(tmp_path, self.path)
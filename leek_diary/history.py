@@ -0,0 +1,306 @@
+"""本地歷史股價資料庫、走勢區間與降採樣"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .cache import LRUCache
+from .errors import HistoryUnavailable
+from .instrumentation import cache_lookup, timed
+from .markets import MARKET_SESSIONS, last_market_close, to_yf_ticker
+from .providers import default_provider
+
+# 歷史股價的本地存放目錄，以及交易時段內向 yfinance 補抓最新 K 棒的最短間隔 (秒)
+HISTORY_CACHE_DIR = os.path.join('.cache', 'history')
+HISTORY_REFRESH_INTERVAL = 15 * 60
+# 平行抓取歷史資料時的最大執行緒數，以及每個請求的逾時秒數
+HISTORY_FETCH_WORKERS = 8
+HISTORY_FETCH_TIMEOUT = 10
+# 記憶體中保留最近讀取過的歷史資料筆數
+HISTORY_MEMORY_CACHE_SIZE = 64
+# 補抓時重疊的已收盤 K 棒收盤價差異超過這個比例，視為除權息或分割後 yfinance 重新還原了過去的股價
+HISTORY_ADJUSTMENT_TOLERANCE = 1e-4
+
+# 走勢圖可選的區間 (代碼 → 顯示名稱)。每支股票只保存一份五年的資料，各區間都從中切片
+HISTORY_RANGES = {
+    '1M': '1個月',
+    '3M': '3個月',
+    '6M': '6個月',
+    '1Y': '1年',
+    '5Y': '5年',
+    'YTD': '今年以來',
+}
+HISTORY_RANGE_MONTHS = {'1M': 1, '3M': 3, '6M': 6, '1Y': 12, '5Y': 60}
+HISTORY_SUPERSET_DAYS = 5 * 366 + 7
+MOVING_AVERAGE_WINDOWS = (20, 60)
+
+class HistoryStore:
+    """每支股票一個 Parquet 檔的 OHLCV 歷史資料庫
+
+    讀取時只向資料來源 (預設為 yfinance) 補抓最後一筆已存資料之後的 K 棒，其餘皆從本地磁碟讀取；
+    最近讀過的資料另外保留在記憶體，檔案沒變就不重新讀檔。
+    補抓的資料與本地最後兩根 K 棒重疊，已收盤的那根價格對不上時 (除權息、分割後還原價改變) 整份重新抓取。
+    每個檔案旁的 .json 記錄已經抓過的最早日期，上市不久的股票不會因為資料不夠早而每次重抓。
+    """
+
+    def __init__(self, directory=HISTORY_CACHE_DIR, refresh_interval=HISTORY_REFRESH_INTERVAL, memory_size=HISTORY_MEMORY_CACHE_SIZE, provider=None):
+        self.directory = directory
+        self.provider = provider or default_provider()
+        self.refresh_interval = refresh_interval
+        self._memory = LRUCache(memory_size)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _path(self, ticker):
+        return os.path.join(self.directory, f"{ticker}.parquet")
+
+    def _coverage_path(self, ticker):
+        return os.path.join(self.directory, f"{ticker}.json")
+
+    def _lock_for(self, ticker):
+        with self._locks_guard:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def load(self, ticker):
+        path = self._path(ticker)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._memory.get(ticker)
+        cache_lookup('history', cached is not None and cached[0] == mtime)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with timed('history.read_parquet'):
+                history = pd.read_parquet(path)
+        except Exception:
+            # 檔案損毀時當作沒有快取，重新完整抓取
+            return None
+        self._memory.set(ticker, (mtime, history))
+        return history
+
+    def save(self, ticker, history, covered_from=None):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(ticker)
+        tmp_path = f"{path}.tmp"
+        with timed('history.write_parquet'):
+            history.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+        self._memory.set(ticker, (os.stat(path).st_mtime_ns, history))
+        if covered_from is not None:
+            with open(self._coverage_path(ticker), 'w', encoding='utf-8') as f:
+                json.dump({'start': pd.Timestamp(covered_from).strftime('%Y-%m-%d')}, f)
+
+    def covered_from(self, ticker, stored):
+        """已抓過的最早日期：有記錄就用記錄，否則用第一根 K 棒的日期"""
+        try:
+            with open(self._coverage_path(ticker), 'r', encoding='utf-8') as f:
+                return align_timestamp(json.load(f)['start'], stored.index)
+        except (OSError, ValueError, KeyError):
+            return stored.index.min()
+
+    def is_up_to_date(self, ticker, market):
+        """本地檔案在最近一次收盤後已更新過，或交易時段內剛更新過"""
+        updated_at = self.updated_at(ticker)
+        if updated_at is None:
+            return False
+        if time.time() - updated_at < self.refresh_interval:
+            return True
+        closed_at = last_market_close(market) if market in MARKET_SESSIONS else None
+        return closed_at is not None and updated_at >= closed_at.timestamp()
+
+    def updated_at(self, ticker):
+        """本地資料最後一次更新的時間 (epoch 秒)，沒有資料時回傳 None"""
+        try:
+            return os.path.getmtime(self._path(ticker))
+        except OSError:
+            return None
+
+    def _load_covering(self, ticker, start):
+        """回傳 (涵蓋 start 的本地資料, 對齊後的 start)；本地資料不夠早時資料為 None"""
+        stored = self.load(ticker)
+        if stored is None or stored.empty:
+            return None, None
+        start_ts = align_timestamp(start, stored.index)
+        # 本地資料不夠早 (多留一週容忍假日) 時需要重新抓取完整區間
+        if self.covered_from(ticker, stored) > start_ts + timedelta(days=7):
+            return None, None
+        return stored, start_ts
+
+    def get(self, ticker, market, start, timeout=HISTORY_FETCH_TIMEOUT, refresh=True):
+        """回傳 start 之後的歷史資料，只有本地缺少的 K 棒才會向 yfinance 抓取
+
+        refresh=False 時只要本地有資料就直接使用，不補抓最新的 K 棒 (交給背景更新)。
+        """
+        if not refresh:
+            stored, start_ts = self._load_covering(ticker, start)
+            if stored is not None:
+                return stored[stored.index >= start_ts]
+
+        with self._lock_for(ticker):
+            stored, start_ts = self._load_covering(ticker, start)
+            if stored is not None and (not refresh or self.is_up_to_date(ticker, market)):
+                return stored[stored.index >= start_ts]
+
+            full_fetch = stored is None
+            covered_from = start if full_fetch else None
+            # 從倒數第二根 K 棒開始抓：最後一根可能是盤中資料，倒數第二根已收盤，可以用來比對還原價
+            fetch_start = start if full_fetch else stored.index[-min(2, len(stored))].date()
+            try:
+                fetched = self.provider.history(ticker, fetch_start, timeout)
+                if not full_fetch and _is_readjusted(stored, fetched):
+                    covered_from = self.covered_from(ticker, stored)
+                    fetched = self.provider.history(ticker, covered_from.date(), timeout)
+                    full_fetch = True
+            except Exception:
+                if stored is None:
+                    raise
+                # 網路失敗時先使用本地資料
+                return stored[stored.index >= start_ts]
+
+            if full_fetch:
+                history = fetched
+            elif fetched.empty:
+                history = stored
+            else:
+                # 最後一根已存的 K 棒可能是盤中資料，以新抓到的為準
+                history = pd.concat([stored, fetched])
+                history = history[~history.index.duplicated(keep='last')].sort_index()
+
+            if history.empty:
+                return history
+            self.save(ticker, history, covered_from=covered_from)
+            return history[history.index >= align_timestamp(start, history.index)]
+
+def _is_readjusted(stored, fetched):
+    """補抓的資料中，本地倒數第二根 (已收盤) K 棒的收盤價與本地不同，代表過去的還原價已經改變"""
+    if len(stored) < 2:
+        return False
+    overlap = stored.index[-2]
+    if overlap not in fetched.index:
+        return False
+    before = stored['Close'].iloc[-2]
+    after = fetched.at[overlap, 'Close']
+    if pd.isna(before) or pd.isna(after):
+        return False
+    return abs(after - before) > HISTORY_ADJUSTMENT_TOLERANCE * abs(before)
+
+def align_timestamp(value, index):
+    timestamp = pd.Timestamp(value)
+    tz = getattr(index, 'tz', None)
+    if tz is not None and timestamp.tzinfo is None:
+        return timestamp.tz_localize(tz)
+    if tz is None and timestamp.tzinfo is not None:
+        return timestamp.tz_localize(None)
+    return timestamp
+
+def history_range_start(period, now=None):
+    now = pd.Timestamp(now or datetime.now())
+    if period == 'YTD':
+        return datetime(now.year, 1, 1)
+    return (now - pd.DateOffset(months=HISTORY_RANGE_MONTHS[period])).to_pydatetime()
+
+def add_rolling_indicators(history):
+    """以 rolling 視窗計算移動平均線，在完整資料上計算，切片後區間開頭的均線也是正確的"""
+    close = history['Close']
+    return history.assign(**{f'MA{window}': close.rolling(window, min_periods=window).mean() for window in MOVING_AVERAGE_WINDOWS})
+
+def history_superset_start(now=None):
+    return (pd.Timestamp(now or datetime.now()) - timedelta(days=HISTORY_SUPERSET_DAYS)).to_pydatetime()
+
+def load_stock_history(store, symbol, market, period='6M', timeout=HISTORY_FETCH_TIMEOUT, refresh=True, now=None):
+    """回傳 period 區間的歷史資料 (含移動平均線)；取不到資料時拋出 HistoryUnavailable
+
+    區間以 now (預設為現在) 往前計算。
+    """
+    try:
+        superset = store.get(to_yf_ticker(symbol, market), market, history_superset_start(now), timeout=timeout, refresh=refresh)
+    except Exception as e:
+        raise HistoryUnavailable(symbol, str(e)) from e
+    if superset is None or superset.empty:
+        raise HistoryUnavailable(symbol, '沒有資料')
+
+    with timed('history.indicators'):
+        history = add_rolling_indicators(superset)
+    history = history[history.index >= align_timestamp(history_range_start(period, now), history.index)]
+    if history.empty:
+        raise HistoryUnavailable(symbol, '沒有資料')
+    return history
+
+def fetch_histories(store, stocks, max_workers=HISTORY_FETCH_WORKERS, timeout=HISTORY_FETCH_TIMEOUT):
+    """以有限數量的執行緒平行抓取多支股票的歷史資料
+
+    回傳 (symbol → history, symbol → 失敗原因)。
+    """
+    stocks = list(dict.fromkeys(stocks))
+    histories = {}
+    failures = {}
+    if not stocks:
+        return histories, failures
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(stocks))) as executor:
+        # 每個工作帶著呼叫端的 context，抓取時間記到呼叫端的效能統計
+        futures = {
+            executor.submit(contextvars.copy_context().run, load_stock_history, store, symbol, market, '6M', timeout): symbol
+            for symbol, market in stocks
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                histories[symbol] = future.result()
+            except HistoryUnavailable as e:
+                failures[symbol] = e.reason
+    return histories, failures
+
+# 價格圖表每條線最多傳給瀏覽器的點數 (約等於圖表的像素寬度)
+CHART_MAX_POINTS = 1000
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets 降採樣，回傳保留下來的資料位置
+
+    第一點與最後一點一定保留，中間每個區間保留與前一個保留點、下一個區間平均點
+    所構成三角形面積最大的那一點，因此能保留走勢的高低轉折。
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    sampled = np.empty(threshold, dtype=np.int64)
+    sampled[0] = 0
+    sampled[-1] = n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        next_start = min(end, n - 1)
+        avg_x = x[next_start:max(next_end, next_start + 1)].mean()
+        avg_y = y[next_start:max(next_end, next_start + 1)].mean()
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        sampled[i + 1] = a
+    return sampled
+
+def downsample_history(history, max_points=CHART_MAX_POINTS):
+    """回傳 (依收盤價降採樣後的資料列, 依相同點數分桶加總的成交量)，資料點不超過 max_points 時原樣回傳"""
+    if len(history) <= max_points:
+        return history, history['Volume']
+
+    x = history.index.asi8.astype('float64')
+    close = history['Close'].to_numpy(dtype='float64')
+    sampled = history.iloc[lttb_indices(x, close, max_points)]
+
+    buckets = np.arange(len(history)) * max_points // len(history)
+    volume_sums = np.bincount(buckets, weights=history['Volume'].to_numpy(dtype='float64'), minlength=max_points)
+    bucket_starts = np.searchsorted(buckets, np.arange(max_points))
+    volume = pd.Series(volume_sums, index=history.index[bucket_starts], name='Volume')
+    return sampled, volume
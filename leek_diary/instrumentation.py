@@ -0,0 +1,142 @@
+"""每次執行 (頁面 rerun 或背景更新一輪) 的效能統計
+
+各模組在網路請求、檔案讀寫、pandas 計算與圖表建立的位置呼叫 timed()、add_bytes() 與 cache_lookup()，
+統計會記到目前執行中的 RunStats；沒有開始統計時這些呼叫幾乎沒有成本。
+目前的 RunStats 存在 contextvar 中，每個頁面 session 的執行緒各自獨立；
+要在其他執行緒中繼續記錄時，以 contextvars.copy_context() 帶過去。
+"""
+
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# 記憶體中保留最近幾次執行的統計、匯出檔案預設的檔名，以及持續寫入統計檔案的環境變數
+RUN_LOG_SIZE = 50
+RUN_LOG_EXPORT_NAME = 'leek_diary_runs.jsonl'
+RUN_LOG_PATH_ENV = 'LEEK_DIARY_METRICS_PATH'
+
+_current_run = contextvars.ContextVar('leek_diary_run', default=None)
+
+class RunStats:
+    """一次執行的統計：每個階段的呼叫次數、總秒數與抓取的位元組數，以及各快取的命中與未命中次數"""
+
+    def __init__(self, label):
+        self.label = label
+        self.started_at = time.time()
+        self.seconds = None
+        self.stages = {}
+        self.caches = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds=0.0, nbytes=0, calls=1):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+            entry['calls'] += calls
+            entry['seconds'] += seconds
+            entry['bytes'] += nbytes
+
+    def cache_lookup(self, cache, hit, count=1):
+        with self._lock:
+            entry = self.caches.setdefault(cache, {'hits': 0, 'misses': 0})
+            entry['hits' if hit else 'misses'] += count
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self._started
+
+    def to_record(self):
+        """轉成可以寫成一行 JSON 的字典"""
+        with self._lock:
+            caches = {
+                name: dict(entry, hit_ratio=entry['hits'] / (entry['hits'] + entry['misses']) if entry['hits'] + entry['misses'] else None)
+                for name, entry in self.caches.items()
+            }
+            return {
+                'label': self.label,
+                'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='milliseconds'),
+                'seconds': self.seconds,
+                'stages': {name: dict(entry) for name, entry in self.stages.items()},
+                'caches': caches,
+            }
+
+def begin_run(label):
+    """開始統計一次執行並設為目前的 RunStats；沒有配對的 end_run() 時 (例如中途 rerun)，統計直接丟棄"""
+    stats = RunStats(label)
+    _current_run.set(stats)
+    return stats
+
+def end_run(run_log=None):
+    """結束目前的統計，加入 run_log 後回傳"""
+    stats = _current_run.get()
+    if stats is None:
+        return None
+    _current_run.set(None)
+    stats.finish()
+    if run_log is not None:
+        run_log.append(stats)
+    return stats
+
+@contextmanager
+def collect(label, run_log=None):
+    """在 with 區塊內統計；已經有統計在進行時直接併入，不另外開始"""
+    if _current_run.get() is not None:
+        yield _current_run.get()
+        return
+    stats = begin_run(label)
+    try:
+        yield stats
+    finally:
+        end_run(run_log)
+
+@contextmanager
+def timed(stage):
+    stats = _current_run.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.record(stage, time.perf_counter() - start)
+
+def add_bytes(stage, nbytes):
+    stats = _current_run.get()
+    if stats is not None:
+        stats.record(stage, nbytes=nbytes, calls=0)
+
+def cache_lookup(cache, hit, count=1):
+    stats = _current_run.get()
+    if stats is not None and count:
+        stats.cache_lookup(cache, hit, count)
+
+class RunLog:
+    """最近幾次執行的統計；指定 path 時每次執行結束都追加一行 JSON 到檔案"""
+
+    def __init__(self, max_size=RUN_LOG_SIZE, path=None):
+        self.path = path
+        self._runs = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+
+    def append(self, stats):
+        record = stats.to_record()
+        with self._lock:
+            self._runs.append(record)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def records(self):
+        with self._lock:
+            return list(self._runs)
+
+    def latest(self):
+        with self._lock:
+            return self._runs[-1] if self._runs else None
+
+    def to_jsonl(self):
+        return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in self.records())
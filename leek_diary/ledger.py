@@ -0,0 +1,217 @@
+"""交易帳本、持股彙總與估值"""
+
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from .errors import QuoteUnavailable
+from .instrumentation import cache_lookup, timed
+from .lots import DEFAULT_COST_METHOD, track_lots
+from .markets import MARKET_CURRENCIES
+
+LEDGER_COLUMNS = ['Symbol', 'Date', 'Type', 'Price', 'Quantity']
+POSITION_COLUMNS = ['Name', 'Market', 'Buy Quantity', 'Sell Quantity', 'Buy Cost', 'Sell Value',
+                    'Current Quantity', 'Average Buy Price', 'Average Sell Price', 'Open Cost', 'Realized Profit/Loss']
+
+def build_ledger(portfolio):
+    """把所有股票的交易攤平成一個型別固定的 DataFrame，每筆交易一列"""
+    records = [
+        (stock['Symbol'], t['Date'], t['Type'], t['Price'], t['Quantity'])
+        for stock in portfolio
+        for t in stock['Transactions']
+    ]
+    ledger = pd.DataFrame.from_records(records, columns=LEDGER_COLUMNS)
+    ledger = ledger.astype({'Symbol': 'category', 'Type': 'category', 'Price': 'float64', 'Quantity': 'float64'})
+    ledger['Date'] = pd.to_datetime(ledger['Date'], format='%Y-%m-%d')
+    return ledger
+
+def summarize_ledger(ledger, portfolio, cost_method=DEFAULT_COST_METHOD, lots=None):
+    """以 groupby 一次計算所有股票的持股數量、成本與買賣均價，回傳以 Symbol 為索引的 DataFrame
+
+    未賣出持股的成本 (Open Cost) 與已實現損益依交易日期順序以 cost_method 配對批次計算；
+    已經算好的 lots (symbol → LotTracker) 可直接傳入。
+    """
+    holdings = pd.DataFrame(
+        [(stock['Symbol'], stock['Name'], stock['Market']) for stock in portfolio],
+        columns=['Symbol', 'Name', 'Market']
+    ).set_index('Symbol')
+
+    is_buy = (ledger['Type'] == '買入').to_numpy()
+    quantity = ledger['Quantity'].to_numpy()
+    value = ledger['Price'].to_numpy() * quantity
+    flows = pd.DataFrame({
+        'Symbol': ledger['Symbol'],
+        'Buy Quantity': np.where(is_buy, quantity, 0.0),
+        'Sell Quantity': np.where(is_buy, 0.0, quantity),
+        'Buy Cost': np.where(is_buy, value, 0.0),
+        'Sell Value': np.where(is_buy, 0.0, value),
+    })
+    totals = flows.groupby('Symbol', observed=True).sum()
+
+    positions = holdings.join(totals).fillna({column: 0.0 for column in totals.columns})
+    positions['Current Quantity'] = positions['Buy Quantity'] - positions['Sell Quantity']
+    positions['Average Buy Price'] = _safe_divide(positions['Buy Cost'], positions['Buy Quantity'])
+    positions['Average Sell Price'] = _safe_divide(positions['Sell Value'], positions['Sell Quantity'])
+
+    if lots is None:
+        lots = track_lots(ledger, cost_method)
+    positions['Open Cost'] = [lots[symbol].cost if symbol in lots else 0.0 for symbol in positions.index]
+    positions['Realized Profit/Loss'] = [lots[symbol].realized if symbol in lots else 0.0 for symbol in positions.index]
+    return positions[POSITION_COLUMNS]
+
+def _safe_divide(numerator, denominator):
+    numerator = numerator.to_numpy(dtype='float64')
+    denominator = denominator.to_numpy(dtype='float64')
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+def _ledger_fingerprint(stock):
+    payload = json.dumps([stock['Name'], stock['Market'], stock['Transactions']], ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+class PositionBook:
+    """保存每支股票持股彙總的帳本
+
+    新增或刪除交易時只更新該股票的那一列，其他股票的彙總、持有批次與估值結果在下次 rerun 時直接沿用。
+    """
+
+    def __init__(self, cost_method=DEFAULT_COST_METHOD):
+        self.cost_method = cost_method
+        self.positions = summarize_ledger(build_ledger([]), [], cost_method)
+        self.version = 0
+        self._fingerprints = {}
+        self._lots = {}
+        self._valuation = None
+
+    def _summarize(self, stocks):
+        ledger = build_ledger(stocks)
+        lots = track_lots(ledger, self.cost_method)
+        for stock in stocks:
+            self._lots.pop(stock['Symbol'], None)
+        self._lots.update(lots)
+        return summarize_ledger(ledger, stocks, lots=lots)
+
+    @timed('ledger.sync')
+    def sync(self, portfolio):
+        """與投資組合比對，只重新計算交易有變動的股票"""
+        fingerprints = {stock['Symbol']: _ledger_fingerprint(stock) for stock in portfolio}
+        changed = [stock for stock in portfolio if self._fingerprints.get(stock['Symbol']) != fingerprints[stock['Symbol']]]
+        removed = [symbol for symbol in self._fingerprints if symbol not in fingerprints]
+        if not changed and not removed and list(self.positions.index) == list(fingerprints):
+            return
+
+        positions = self.positions.drop(removed + [stock['Symbol'] for stock in changed], errors='ignore')
+        for symbol in removed:
+            self._lots.pop(symbol, None)
+        if changed:
+            positions = pd.concat([positions, self._summarize(changed)])
+        self.positions = positions.reindex(list(fingerprints))
+        self._fingerprints = fingerprints
+        self.version += 1
+
+    def set_cost_method(self, cost_method, portfolio):
+        """切換成本計算方式，所有股票重新配對批次"""
+        if cost_method == self.cost_method:
+            return
+        self.cost_method = cost_method
+        self._fingerprints = {}
+        self._lots = {}
+        self.sync(portfolio)
+
+    def apply_transaction(self, stock, transaction):
+        """新增一筆交易：只累加該股票的買賣數量與金額
+
+        交易日期不早於該股票已套用的最後一筆時，直接接在持有批次後面；否則整支股票重新配對。
+        """
+        symbol = stock['Symbol']
+        date = np.datetime64(transaction['Date'])
+        tracker = self._lots.get(symbol)
+        if symbol not in self.positions.index or tracker is None or date < tracker.last_date:
+            self.rebuild(stock)
+            return
+        tracker.apply(date, transaction['Type'], float(transaction['Price']), float(transaction['Quantity']))
+
+        value = transaction['Price'] * transaction['Quantity']
+        if transaction['Type'] == '買入':
+            self.positions.loc[symbol, ['Buy Quantity', 'Buy Cost']] += [transaction['Quantity'], value]
+        else:
+            self.positions.loc[symbol, ['Sell Quantity', 'Sell Value']] += [transaction['Quantity'], value]
+
+        row = self.positions.loc[symbol]
+        self.positions.loc[symbol, 'Current Quantity'] = row['Buy Quantity'] - row['Sell Quantity']
+        self.positions.loc[symbol, 'Average Buy Price'] = row['Buy Cost'] / row['Buy Quantity'] if row['Buy Quantity'] > 0 else 0.0
+        self.positions.loc[symbol, 'Average Sell Price'] = row['Sell Value'] / row['Sell Quantity'] if row['Sell Quantity'] > 0 else 0.0
+        self.positions.loc[symbol, ['Open Cost', 'Realized Profit/Loss']] = [tracker.cost, tracker.realized]
+        self._fingerprints[symbol] = _ledger_fingerprint(stock)
+        self.version += 1
+
+    @timed('ledger.update')
+    def rebuild(self, stock):
+        """重新計算單一股票 (例如刪除交易後)"""
+        symbol = stock['Symbol']
+        row = self._summarize([stock])
+        if symbol in self.positions.index:
+            self.positions.loc[symbol] = row.loc[symbol]
+        else:
+            self.positions = pd.concat([self.positions, row])
+        self._fingerprints[symbol] = _ledger_fingerprint(stock)
+        self.version += 1
+
+    def remove(self, symbol):
+        self.positions = self.positions.drop(symbol, errors='ignore')
+        self._fingerprints.pop(symbol, None)
+        self._lots.pop(symbol, None)
+        self.version += 1
+
+    def value(self, prices, fx_rates):
+        """估值結果依 (帳本版本, 報價, 匯率表) 快取，三者都沒變時直接沿用"""
+        key = (self.version, tuple(sorted(prices.items())), fx_rates.table()['fetched_at'])
+        cache_lookup('valuation', self._valuation is not None and self._valuation[0] == key)
+        if self._valuation is None or self._valuation[0] != key:
+            with timed('ledger.valuation'):
+                self._valuation = (key, calculate_performance(self.positions, prices, fx_rates))
+        return self._valuation[1]
+
+def calculate_performance(positions, prices, fx_rates):
+    frame = positions.assign(Price=pd.Series(prices, dtype='float64').reindex(positions.index))
+    frame = frame[frame['Price'].notna()]
+
+    rates = {market: fx_rates.rate(MARKET_CURRENCIES.get(market, 'TWD'), 'TWD') for market in frame['Market'].unique()}
+    to_twd_rate = frame['Market'].map(rates).astype('float64')
+
+    current_price = frame['Price']
+    current_quantity = frame['Current Quantity']
+    average_buy_price = frame['Average Buy Price']
+    unrealized_profit_loss = current_price * current_quantity - frame['Open Cost']
+    realized_profit_loss = frame['Realized Profit/Loss']
+    total_profit_loss = unrealized_profit_loss + realized_profit_loss
+    performance_pct = _safe_divide(total_profit_loss, frame['Buy Cost']) * 100
+
+    currency = frame['Market'].map({'美股': 'US$'}).fillna('NT$')
+    performance = pd.DataFrame({
+        'Symbol': frame.index,
+        'Name': frame['Name'],
+        'Market': frame['Market'],
+        'Current Quantity': current_quantity,
+        'Average Buy Price': currency + average_buy_price.map('{:.2f}'.format).astype('str'),
+        'Average Sell Price': currency + frame['Average Sell Price'].map('{:.2f}'.format).astype('str'),
+        'Current Price': currency + current_price.map('{:.2f}'.format).astype('str'),
+        'Current Value (TWD)': current_price * current_quantity * to_twd_rate,
+        'Total Invested (TWD)': frame['Buy Cost'] * to_twd_rate,
+        'Unrealized Profit/Loss (TWD)': unrealized_profit_loss * to_twd_rate,
+        'Realized Profit/Loss (TWD)': realized_profit_loss * to_twd_rate,
+        'Total Profit/Loss (TWD)': total_profit_loss * to_twd_rate,
+        'Performance %': performance_pct,
+    })
+    return performance.reset_index(drop=True)
+
+def value_portfolio(portfolio, prices, fx_rates, cost_method=DEFAULT_COST_METHOD):
+    """估值整份投資組合，回傳 (估值結果, 錯誤列表)
+
+    prices 為 symbol → 價格；沒有價格的股票不列入估值，並以 QuoteUnavailable 回報。
+    """
+    positions = summarize_ledger(build_ledger(portfolio), portfolio, cost_method)
+    missing = [symbol for symbol in positions.index if symbol not in prices]
+    errors = [QuoteUnavailable(missing)] if missing else []
+    return calculate_performance(positions, prices, fx_rates), errors
@@ -0,0 +1,89 @@
+"""以持有批次 (lot) 計算成本與已實現損益"""
+
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# 成本計算方式：先進先出，或移動平均成本
+COST_METHODS = {'fifo': '先進先出 (FIFO)', 'average': '移動平均成本'}
+DEFAULT_COST_METHOD = 'fifo'
+
+class LotTracker:
+    """單一股票依交易日期順序累計的持有批次
+
+    每個批次是 [剩餘股數, 單位成本]；先進先出時賣出從最早的批次扣除，
+    移動平均時所有持股合併成一個以平均成本計價的批次。
+    """
+
+    def __init__(self, method=DEFAULT_COST_METHOD):
+        if method not in COST_METHODS:
+            raise ValueError(f"不支援的成本計算方式: {method}")
+        self.method = method
+        self.lots = deque()
+        self.realized = 0.0
+        self.last_date = None
+
+    @property
+    def quantity(self):
+        return sum(quantity for quantity, _ in self.lots)
+
+    @property
+    def cost(self):
+        """未賣出持股的總成本"""
+        return sum(quantity * price for quantity, price in self.lots)
+
+    def apply(self, date, kind, price, quantity):
+        """依日期順序套用一筆交易；日期早於已套用的交易時必須整支股票重算"""
+        self.last_date = date
+        self.extend([kind == '買入'], [price], [quantity])
+
+    def extend(self, is_buy, prices, quantities):
+        """依序套用多筆已按日期排序的交易 (迴圈內只用區域變數，供大量交易時使用)"""
+        lots = self.lots
+        average = self.method == 'average'
+        realized = self.realized
+        for buy, price, quantity in zip(is_buy, prices, quantities):
+            if buy:
+                if average and lots:
+                    held, cost = lots[0]
+                    lots[0] = [held + quantity, (held * cost + quantity * price) / (held + quantity)]
+                else:
+                    lots.append([quantity, price])
+                continue
+
+            # 賣出超過持股的部分沒有成本可對應，不列入已實現損益
+            while quantity > 0 and lots:
+                lot = lots[0]
+                matched = min(quantity, lot[0])
+                realized += (price - lot[1]) * matched
+                lot[0] -= matched
+                quantity -= matched
+                if lot[0] <= 0:
+                    lots.popleft()
+        self.realized = realized
+
+def track_lots(ledger, method=DEFAULT_COST_METHOD):
+    """整個帳本只排序一次 (依股票、日期，同一天保留輸入順序)，再逐支股票線性走過，回傳 symbol → LotTracker"""
+    codes, symbols = pd.factorize(ledger['Symbol'].astype('str'))
+    dates = ledger['Date'].to_numpy()
+    order = np.lexsort((dates, codes))
+
+    codes = codes[order]
+    dates = dates[order]
+    is_buy = (ledger['Type'] == '買入').to_numpy()[order].tolist()
+    prices = ledger['Price'].to_numpy()[order].tolist()
+    quantities = ledger['Quantity'].to_numpy()[order].tolist()
+    # 排序後同一支股票的交易相鄰，bounds 是每一段的起點與終點
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    starts = [0] + bounds.tolist()
+    ends = bounds.tolist() + [len(codes)]
+
+    trackers = {}
+    for start, end in zip(starts, ends):
+        if start == end:
+            continue
+        tracker = trackers[symbols[codes[start]]] = LotTracker(method)
+        tracker.extend(is_buy[start:end], prices[start:end], quantities[start:end])
+        tracker.last_date = dates[end - 1]
+    return trackers
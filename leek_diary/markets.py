@@ -0,0 +1,52 @@
+"""市場代號、交易時段與幣別"""
+
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# 台股上市 (TWSE) 與上櫃 (TPEx) 在 Yahoo Finance 的代號後綴；交易所由股票代號目錄登記，沒有登記的代號視為上市
+TW_EXCHANGE_SUFFIXES = {'TWSE': '.TW', 'TPEx': '.TWO'}
+_tw_exchanges = {}
+
+def register_exchanges(exchanges):
+    """登記台股代號 → 交易所 ('TWSE' 或 'TPEx')，之後 to_yf_ticker 依此決定後綴"""
+    _tw_exchanges.update(exchanges)
+
+def to_yf_ticker(symbol, market, exchange=None):
+    if market == '美股':
+        return symbol
+    exchange = exchange or _tw_exchanges.get(symbol, 'TWSE')
+    return f"{symbol}{TW_EXCHANGE_SUFFIXES.get(exchange, '.TW')}"
+
+# 各市場的時區與交易時段 (開盤、收盤，以當地時間的分鐘數表示)
+MARKET_SESSIONS = {
+    '台股': (ZoneInfo('Asia/Taipei'), 9 * 60, 13 * 60 + 30),
+    '美股': (ZoneInfo('America/New_York'), 9 * 60 + 30, 16 * 60),
+}
+
+def last_market_close(market, now=None):
+    """回傳 now 之前最近一次收盤的時間；若市場目前正在交易則回傳 None"""
+    tz, open_minute, close_minute = MARKET_SESSIONS[market]
+    local_now = (now or datetime.now(tz)).astimezone(tz)
+    minute_of_day = local_now.hour * 60 + local_now.minute
+    is_weekday = local_now.weekday() < 5
+
+    if is_weekday and open_minute <= minute_of_day < close_minute:
+        return None
+
+    day = local_now.date()
+    if not (is_weekday and minute_of_day >= close_minute):
+        # 尚未開盤或是週末，往前找最近一個交易日
+        day -= timedelta(days=1)
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+    return datetime(day.year, day.month, day.day, tzinfo=tz) + timedelta(minutes=close_minute)
+
+def is_market_open(market, now=None):
+    """市場目前是否在交易時段內；沒有交易時段資料的市場視為未開盤"""
+    return market in MARKET_SESSIONS and last_market_close(market, now) is None
+
+# 各市場的交易幣別
+MARKET_CURRENCIES = {
+    '台股': 'TWD',
+    '美股': 'USD',
+}
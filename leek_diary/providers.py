@@ -0,0 +1,296 @@
+"""行情資料來源：yfinance 與本地錄製/回放
+
+報價、歷史股價、股票資訊與匯率都經由 MarketDataProvider 取得。
+RecordingProvider 把另一個來源的回應存到目錄中，ReplayProvider 再從同一個目錄讀回，
+可以加上固定延遲模擬網路，讓效能測試不連網且每次結果相同。
+連網的來源外面再包一層 SchedulingProvider，所有 session 共用同一個請求排程。
+每個請求的時間與資料量都記到 instrumentation；yfinance 的資料量以解析後 DataFrame 的大小估算。
+"""
+
+import json
+import os
+from abc import ABC, abstractmethod
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+import yfinance as yf
+from yfinance.exceptions import YFRateLimitError
+
+from .instrumentation import add_bytes, timed
+from .scheduler import FetchScheduler
+
+# 以環境變數切換預設的資料來源：設定回放目錄就改用 ReplayProvider，設定錄製目錄就把 yfinance 的回應存下來
+PROVIDER_REPLAY_DIR_ENV = 'LEEK_DIARY_REPLAY_DIR'
+PROVIDER_REPLAY_LATENCY_ENV = 'LEEK_DIARY_REPLAY_LATENCY'
+PROVIDER_RECORD_DIR_ENV = 'LEEK_DIARY_RECORD_DIR'
+FX_API_URL = "https://api.exchangerate-api.com/v4/latest/{base}"
+# 同時向 yfinance 查詢報價的股票數量
+YFINANCE_QUOTE_WORKERS = 8
+
+def _extract_close(data, ticker):
+    if data is None or data.empty:
+        return None
+    if isinstance(data.columns, pd.MultiIndex):
+        if ticker not in data.columns.get_level_values(0):
+            return None
+        close = data[ticker]['Close']
+    else:
+        close = data['Close']
+    close = close.dropna()
+    if close.empty:
+        return None
+    return float(close.iloc[-1])
+
+class MarketDataProvider(ABC):
+    """行情資料來源的介面，ticker 都是 yfinance 格式 (例如 2330.TW、AAPL)"""
+
+    @abstractmethod
+    def quotes(self, tickers):
+        """回傳 ticker → 最新價格；取不到的 ticker 不列入，整批失敗時拋出例外"""
+
+    @abstractmethod
+    def history(self, ticker, start, timeout):
+        """回傳 start 之後的日 K DataFrame (Open、High、Low、Close、Volume)"""
+
+    @abstractmethod
+    def stock_info(self, ticker):
+        """回傳股票資訊字典 (至少有 longName)；查無此代號時回傳 None 或拋出 404 錯誤"""
+
+    @abstractmethod
+    def fx_rates(self, base, timeout):
+        """回傳 {'base': base, 'rates': {currency: rate}}"""
+
+class YFinanceProvider(MarketDataProvider):
+    def __init__(self, workers=YFINANCE_QUOTE_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def quotes(self, tickers):
+        """每支股票各自查詢 (yf.download 內部也是如此)，但限流錯誤不會被 yf.download 吞掉
+
+        任何一支股票被限流時整批拋出 YFRateLimitError，交給 FetchScheduler 退避後重試。
+        """
+        def fetch(ticker):
+            # 取 5 天資料以避開假日沒有當日 K 棒的情況
+            return yf.Ticker(ticker).history(period="5d")
+
+        with timed('yfinance.quotes'):
+            futures = {ticker: self._executor.submit(fetch, ticker) for ticker in tickers}
+            prices = {}
+            nbytes = 0
+            rate_limited = None
+            for ticker, future in futures.items():
+                try:
+                    data = future.result()
+                except YFRateLimitError as e:
+                    rate_limited = e
+                    continue
+                except Exception:
+                    # 其他錯誤 (下市、查無資料) 與 yf.download 一樣視為取不到這支股票
+                    continue
+                nbytes += int(data.memory_usage(deep=True).sum())
+                price = _extract_close(data, ticker)
+                if price is not None:
+                    prices[ticker] = price
+        add_bytes('yfinance.quotes', nbytes)
+        if rate_limited is not None:
+            raise rate_limited
+        return prices
+
+    def history(self, ticker, start, timeout):
+        with timed('yfinance.history'):
+            history = yf.Ticker(ticker).history(start=start, timeout=timeout)
+        add_bytes('yfinance.history', int(history.memory_usage(deep=True).sum()))
+        return history
+
+    def stock_info(self, ticker):
+        with timed('yfinance.info'):
+            return yf.Ticker(ticker).info
+
+    def fx_rates(self, base, timeout):
+        with timed('fx.request'):
+            response = requests.get(FX_API_URL.format(base=base), timeout=timeout)
+        add_bytes('fx.request', len(response.content))
+        response.raise_for_status()
+        data = response.json()
+        return {'base': data.get('base', base), 'rates': data['rates']}
+
+class _ProviderDirectory:
+    """錄製與回放共用的目錄結構
+
+        quotes.json          ticker → 價格
+        info.json            ticker → 股票資訊
+        fx/{base}.json       匯率表
+        history/{ticker}.parquet
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *parts)
+
+    def read_json(self, *parts):
+        try:
+            with open(self.path(*parts), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_json(self, data, *parts):
+        path = self.path(*parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+
+class RecordingProvider(MarketDataProvider):
+    """轉呼叫 upstream，並把每個回應寫入 directory 供 ReplayProvider 回放"""
+
+    def __init__(self, upstream, directory):
+        self.upstream = upstream
+        self.files = _ProviderDirectory(directory)
+        self._lock = threading.Lock()
+
+    def _merge_json(self, updates, name):
+        with self._lock:
+            data = self.files.read_json(name) or {}
+            data.update(updates)
+            self.files.write_json(data, name)
+
+    def quotes(self, tickers):
+        prices = self.upstream.quotes(tickers)
+        self._merge_json(prices, 'quotes.json')
+        return prices
+
+    def history(self, ticker, start, timeout):
+        history = self.upstream.history(ticker, start, timeout)
+        path = self.files.path('history', f"{ticker}.parquet")
+        with self._lock:
+            # 同一支股票多次錄製時合併，回放時才能涵蓋所有抓過的區間
+            if os.path.exists(path):
+                history = pd.concat([pd.read_parquet(path), history])
+                history = history[~history.index.duplicated(keep='last')].sort_index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            history.to_parquet(path)
+        return history
+
+    def stock_info(self, ticker):
+        info = self.upstream.stock_info(ticker)
+        self._merge_json({ticker: info}, 'info.json')
+        return info
+
+    def fx_rates(self, base, timeout):
+        table = self.upstream.fx_rates(base, timeout)
+        with self._lock:
+            self.files.write_json(table, 'fx', f"{base}.json")
+        return table
+
+class ReplayProvider(MarketDataProvider):
+    """從錄製目錄讀取回應，不連網
+
+    每次呼叫前等待 latency 秒 (再加上 0 到 jitter 秒的隨機延遲)，模擬真實網路的回應時間；
+    seed 固定時隨機延遲的序列也固定。錄製資料中沒有的 ticker 與真實來源一樣回報失敗。
+    """
+
+    def __init__(self, directory, latency=0.0, jitter=0.0, seed=0):
+        self.files = _ProviderDirectory(directory)
+        self.latency = latency
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._quotes = None
+        self._info = None
+
+    def _wait(self):
+        if self.jitter:
+            with self._lock:
+                delay = self.latency + self._random.uniform(0, self.jitter)
+        else:
+            delay = self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+    @timed('replay.quotes')
+    def quotes(self, tickers):
+        self._wait()
+        if self._quotes is None:
+            self._quotes = self.files.read_json('quotes.json') or {}
+        return {ticker: float(self._quotes[ticker]) for ticker in tickers if ticker in self._quotes}
+
+    @timed('replay.history')
+    def history(self, ticker, start, timeout):
+        self._wait()
+        path = self.files.path('history', f"{ticker}.parquet")
+        if not os.path.exists(path):
+            raise LookupError(f"回放資料中沒有 {ticker} 的歷史股價")
+        history = pd.read_parquet(path)
+        start = pd.Timestamp(start)
+        if history.index.tz is not None and start.tzinfo is None:
+            start = start.tz_localize(history.index.tz)
+        return history[history.index >= start]
+
+    @timed('replay.info')
+    def stock_info(self, ticker):
+        self._wait()
+        if self._info is None:
+            self._info = self.files.read_json('info.json') or {}
+        return self._info.get(ticker)
+
+    @timed('replay.fx')
+    def fx_rates(self, base, timeout):
+        self._wait()
+        table = self.files.read_json('fx', f"{base}.json")
+        if table is None:
+            raise LookupError(f"回放資料中沒有以 {base} 為基準的匯率表")
+        return table
+
+class SchedulingProvider(MarketDataProvider):
+    """經由 FetchScheduler 轉呼叫 upstream：相同的請求進行中時共用結果，並限制速率、重試暫時性錯誤
+
+    報價以 ticker 為單位合併，一批報價中已經有其他 session 在抓的 ticker 不會再送出。
+    每支股票各自向 upstream 查詢，每個請求各取一個權杖，被限流時只重抓被限流的股票。
+    """
+
+    def __init__(self, upstream, scheduler=None):
+        self.upstream = upstream
+        self.scheduler = scheduler or FetchScheduler()
+
+    def quotes(self, tickers):
+        def fetch(key):
+            _, ticker = key
+            return self.upstream.quotes([ticker]).get(ticker)
+
+        prices = self.scheduler.run_many([('quote', ticker) for ticker in tickers], fetch)
+        return {ticker: prices[('quote', ticker)] for ticker in tickers if ('quote', ticker) in prices}
+
+    def history(self, ticker, start, timeout):
+        return self.scheduler.run(('history', ticker, str(start)), lambda: self.upstream.history(ticker, start, timeout))
+
+    def stock_info(self, ticker):
+        return self.scheduler.run(('info', ticker), lambda: self.upstream.stock_info(ticker))
+
+    def fx_rates(self, base, timeout):
+        return self.scheduler.run(('fx', base), lambda: self.upstream.fx_rates(base, timeout))
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+def default_provider():
+    """依環境變數建立 (並重複使用) 預設的資料來源，沒有設定時使用 yfinance；連網的來源都經過共用的請求排程"""
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            replay_dir = os.environ.get(PROVIDER_REPLAY_DIR_ENV)
+            record_dir = os.environ.get(PROVIDER_RECORD_DIR_ENV)
+            if replay_dir:
+                _default_provider = ReplayProvider(replay_dir, latency=float(os.environ.get(PROVIDER_REPLAY_LATENCY_ENV, 0)))
+            elif record_dir:
+                _default_provider = SchedulingProvider(RecordingProvider(YFinanceProvider(), record_dir))
+            else:
+                _default_provider = SchedulingProvider(YFinanceProvider())
+        return _default_provider
@@ -0,0 +1,151 @@
+"""批次報價抓取與報價快取"""
+
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from .cache import LRUCache
+from .instrumentation import cache_lookup
+from .markets import MARKET_SESSIONS, last_market_close, to_yf_ticker
+from .providers import default_provider
+
+# 每批次最多同時查詢的股票數量
+QUOTE_BATCH_SIZE = 100
+
+def get_current_prices(stocks, provider=None):
+    """批次取得多支股票的最新價格
+
+    stocks 為 (symbol, market) 的序列，回傳 (symbol → price 的字典, 無法取得價格的 symbol 列表)。
+    provider 未指定時使用 default_provider()。
+    """
+    provider = provider or default_provider()
+    tickers = {}
+    for symbol, market in stocks:
+        tickers[to_yf_ticker(symbol, market)] = symbol
+
+    prices = {}
+    failed = []
+    ticker_list = list(tickers)
+    for start in range(0, len(ticker_list), QUOTE_BATCH_SIZE):
+        batch = ticker_list[start:start + QUOTE_BATCH_SIZE]
+        try:
+            batch_prices = provider.quotes(batch)
+        except Exception:
+            failed.extend(tickers[ticker] for ticker in batch)
+            continue
+
+        for ticker in batch:
+            if ticker in batch_prices:
+                prices[tickers[ticker]] = batch_prices[ticker]
+            else:
+                failed.append(tickers[ticker])
+
+    return prices, failed
+
+# 報價快取設定：TTL 秒數與最多保留的股票數量
+QUOTE_CACHE_TTL = 60
+QUOTE_CACHE_MAX_SIZE = 1000
+
+class QuoteCache:
+    """跨 session 與 rerun 共用的報價快取
+
+    過期的報價會先直接回傳，同時在背景執行緒批次重新抓取 (stale-while-revalidate)。
+    市場收盤後抓到的報價在下次開盤前都視為最新，不會重複抓取。
+    """
+
+    def __init__(self, fetcher, ttl=QUOTE_CACHE_TTL, max_size=QUOTE_CACHE_MAX_SIZE):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self._entries = LRUCache(max_size)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def is_fresh(self, market, fetched_at, now=None):
+        now = now or time.time()
+        if now - fetched_at < self.ttl:
+            return True
+        if market not in MARKET_SESSIONS:
+            return False
+        closed_at = last_market_close(market, datetime.fromtimestamp(now, ZoneInfo('UTC')))
+        return closed_at is not None and fetched_at >= closed_at.timestamp()
+
+    def get_prices(self, stocks):
+        """回傳 (symbol → price, 失敗的 symbol 列表)，與 get_current_prices 相同"""
+        now = time.time()
+        prices = {}
+        missing = []
+        stale = []
+        for symbol, market in dict.fromkeys(stocks):
+            entry = self._entries.get((symbol, market))
+            if entry is None:
+                missing.append((symbol, market))
+                continue
+            price, fetched_at = entry
+            prices[symbol] = price
+            if not self.is_fresh(market, fetched_at, now):
+                stale.append((symbol, market))
+
+        cache_lookup('quotes', True, len(prices))
+        cache_lookup('quotes', False, len(missing))
+        failed = []
+        if missing:
+            fetched, failed = self._fetch(missing)
+            prices.update(fetched)
+        if stale:
+            self._refresh_in_background(stale)
+        return prices, failed
+
+    def snapshot(self, stocks):
+        """只讀取快取，回傳 symbol → (price, fetched_at)，不會發出任何網路請求"""
+        entries = {}
+        for symbol, market in dict.fromkeys(stocks):
+            entry = self._entries.get((symbol, market))
+            if entry is not None:
+                entries[symbol] = entry
+        cache_lookup('quotes', True, len(entries))
+        cache_lookup('quotes', False, len(set(stocks)) - len(entries))
+        return entries
+
+    def refresh(self, stocks, max_age=None):
+        """同步抓取沒有報價或報價已過期的股票，回傳失敗的 symbol 列表
+
+        指定 max_age 時，抓取超過 max_age 秒的報價即使還在 TTL 內也重新抓取 (即時報價用)。
+        """
+        now = time.time()
+        due = []
+        for symbol, market in dict.fromkeys(stocks):
+            entry = self._entries.get((symbol, market))
+            if entry is None or not self.is_fresh(market, entry[1], now) or (max_age is not None and now - entry[1] >= max_age):
+                due.append((symbol, market))
+        if not due:
+            return []
+        _, failed = self._fetch(due)
+        return failed
+
+    def _fetch(self, stocks):
+        fetched, failed = self.fetcher(stocks)
+        fetched_at = time.time()
+        markets = dict(stocks)
+        for symbol, price in fetched.items():
+            self._entries.set((symbol, markets[symbol]), (price, fetched_at))
+        return fetched, failed
+
+    def _refresh_in_background(self, stocks):
+        with self._lock:
+            stocks = [stock for stock in stocks if stock not in self._refreshing]
+            self._refreshing.update(stocks)
+        if not stocks:
+            return
+
+        def refresh():
+            try:
+                self._fetch(stocks)
+            except Exception:
+                # 背景更新失敗時保留舊報價，下次讀取會再重試
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(stocks)
+
+        threading.Thread(target=refresh, daemon=True).start()
@@ -0,0 +1,72 @@
+"""定期更新報價、匯率與歷史資料的背景執行緒"""
+
+import threading
+import time
+
+from .history import fetch_histories
+from .instrumentation import RunLog, collect
+
+# 背景更新：每輪更新的間隔，以及股票多久沒有被任何頁面讀取就停止追蹤 (秒)
+REFRESHER_INTERVAL = 30
+REFRESHER_WATCH_TTL = 60 * 60
+
+class BackgroundRefresher:
+    """在背景執行緒定期更新報價、匯率與歷史資料快取
+
+    呼叫端只讀取快取中的快照，不受 yfinance 回應速度影響。
+    以 watch() 登記需要追蹤的股票，一段時間沒有再登記的股票會停止更新。
+    """
+
+    def __init__(self, quote_cache, fx_rates, history_store, interval=REFRESHER_INTERVAL, watch_ttl=REFRESHER_WATCH_TTL):
+        self.quote_cache = quote_cache
+        self.fx_rates = fx_rates
+        self.history_store = history_store
+        self.interval = interval
+        self.watch_ttl = watch_ttl
+        self.failed = set()
+        self.error = None
+        self.last_run_at = None
+        # 每輪更新的效能統計
+        self.run_log = RunLog()
+        self._watched = {}
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def watch(self, stocks):
+        """登記要追蹤的 (symbol, market)；有新股票時立即喚醒背景執行緒"""
+        now = time.time()
+        with self._lock:
+            added = [stock for stock in stocks if stock not in self._watched]
+            self._watched.update(dict.fromkeys(stocks, now))
+        if added:
+            self._wake.set()
+
+    def _watched_stocks(self):
+        cutoff = time.time() - self.watch_ttl
+        with self._lock:
+            self._watched = {stock: seen_at for stock, seen_at in self._watched.items() if seen_at >= cutoff}
+            return list(self._watched)
+
+    def refresh_once(self):
+        stocks = self._watched_stocks()
+        self.fx_rates.refresh()
+        if stocks:
+            failed_symbols = set(self.quote_cache.refresh(stocks))
+            self.failed = {(symbol, market) for symbol, market in stocks if symbol in failed_symbols}
+            # 歷史資料各自判斷是否需要補抓，已是最新的股票只會讀取檔案修改時間
+            fetch_histories(self.history_store, stocks)
+        self.last_run_at = time.time()
+
+    def _run(self):
+        while True:
+            try:
+                with collect('background', self.run_log):
+                    self.refresh_once()
+                self.error = None
+            except Exception as e:
+                # 單輪更新失敗時保留舊快照，下一輪再重試
+                self.error = str(e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
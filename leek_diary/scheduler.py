@@ -0,0 +1,189 @@
+"""共用的行情請求排程：合併相同的進行中請求、限制請求速率、失敗時退避重試
+
+多個頁面 session 同時開啟時會對同一批股票要報價；相同的請求還在進行中時，
+後來的呼叫直接等待同一個結果，每支股票同時只會有一個對上游的請求。
+"""
+
+import contextvars
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from yfinance.exceptions import YFRateLimitError
+
+from .instrumentation import cache_lookup, timed
+
+# 對上游的請求速率：每秒補充的權杖數與最多可連續發出的請求數
+FETCH_RATE_LIMIT = 4.0
+FETCH_BURST = 8
+# 暫時性錯誤 (限流、連線逾時、5xx) 最多重試的次數，以及指數退避的起始與最長等待秒數
+FETCH_MAX_RETRIES = 3
+FETCH_BACKOFF_BASE = 0.5
+FETCH_BACKOFF_MAX = 8.0
+# 批次請求中同時對上游發出的請求數
+FETCH_WORKERS = 8
+
+# 批次請求中上游沒有回傳的 key
+_MISSING = object()
+
+def _status_code(error):
+    return getattr(getattr(error, 'response', None), 'status_code', None)
+
+def is_rate_limited(error):
+    return isinstance(error, YFRateLimitError) or _status_code(error) == 429
+
+def is_retryable(error):
+    """限流、5xx 與連線層的錯誤 (逾時、斷線) 值得重試；查無資料等其他錯誤直接回報"""
+    if is_rate_limited(error):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status >= 500
+    # requests 與 curl_cffi 的連線錯誤都繼承 OSError
+    return isinstance(error, OSError)
+
+class TokenBucket:
+    """每秒補充 rate 個權杖、最多累積 capacity 個；沒有權杖時 acquire() 等到有為止"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self):
+        """被上游限流時清空權杖，所有呼叫端一起放慢"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+
+class FetchScheduler:
+    """以 key 合併進行中的請求，並以權杖桶限速、以隨機化的指數退避重試暫時性錯誤
+
+    key 相同的請求還沒完成時，後來的呼叫等待同一個 Future，成功與失敗都共用。
+    每個對上游的請求 (包括重試) 各取一個權杖。
+    """
+
+    def __init__(self, rate=FETCH_RATE_LIMIT, burst=FETCH_BURST, max_retries=FETCH_MAX_RETRIES,
+                 backoff=FETCH_BACKOFF_BASE, max_backoff=FETCH_BACKOFF_MAX, workers=FETCH_WORKERS, seed=None):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._random = random.Random(seed)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _backoff_delay(self, attempt):
+        # full jitter：在 0 到上限之間隨機等待，同時失敗的呼叫端不會在同一時間一起重試
+        with self._lock:
+            return self._random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self, fetch):
+        """取得權杖後呼叫 fetch()，暫時性錯誤依指數退避重試"""
+        for attempt in range(self.max_retries + 1):
+            with timed('scheduler.throttle'):
+                self.bucket.acquire()
+            try:
+                return fetch()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                if is_rate_limited(e):
+                    self.bucket.drain()
+                with timed('scheduler.backoff'):
+                    time.sleep(self._backoff_delay(attempt))
+
+    def _claim(self, keys):
+        """回傳 (由這次呼叫發出請求的 key → Future, 已有請求在進行中的 key → Future)"""
+        owned = {}
+        shared = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._inflight:
+                    shared[key] = self._inflight[key]
+                else:
+                    owned[key] = self._inflight[key] = Future()
+        cache_lookup('inflight', True, len(shared))
+        cache_lookup('inflight', False, len(owned))
+        return owned, shared
+
+    def _settle(self, owned, results=None, error=None):
+        # 先移出進行中的清單，之後的呼叫會發出新的請求；已經拿到 Future 的呼叫端照常取得這次的結果
+        with self._lock:
+            for key in owned:
+                self._inflight.pop(key, None)
+        for key, future in owned.items():
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results.get(key, _MISSING))
+
+    def run(self, key, fetch):
+        """執行 fetch()；相同 key 的請求正在進行時改為等待它的結果"""
+        owned, shared = self._claim([key])
+        if shared:
+            return shared[key].result()
+        try:
+            result = self.call(fetch)
+        except BaseException as e:
+            self._settle(owned, error=e)
+            raise
+        self._settle(owned, {key: result})
+        return result
+
+    def run_many(self, keys, fetch):
+        """批次版本：每個 key 各自呼叫 fetch(key)，回傳 key → 結果；fetch 回傳 None 的 key 不列入
+
+        只有沒在進行中的 key 會交給 fetch，並行執行，各自取得權杖、各自重試，
+        被限流時只重抓失敗的 key。重試後仍失敗的 key 視為取不到；全部失敗時拋出第一個錯誤。
+        """
+        owned, shared = self._claim(keys)
+
+        def fetch_one(key):
+            try:
+                value = self.call(lambda: fetch(key))
+            except BaseException as e:
+                self._settle({key: owned[key]}, error=e)
+                raise
+            self._settle({key: owned[key]}, {} if value is None else {key: value})
+            return value
+
+        futures = {key: self._executor.submit(contextvars.copy_context().run, fetch_one, key) for key in owned}
+        results = {}
+        errors = []
+        for key, future in futures.items():
+            try:
+                value = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if value is not None:
+                results[key] = value
+        for key, future in shared.items():
+            try:
+                value = future.result()
+            except Exception:
+                continue
+            if value is not _MISSING:
+                results[key] = value
+        if errors and not results:
+            raise errors[0]
+        return results
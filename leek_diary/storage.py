@@ -0,0 +1,230 @@
+"""投資組合交易記錄的讀寫與檔案監看"""
+
+import json
+import os
+import threading
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+from .errors import PortfolioFileError
+from .instrumentation import timed
+
+# 投資組合檔案：舊版為單一 JSON 檔，現在改為只追加寫入的 JSON Lines 交易記錄
+PORTFOLIO_PATH = 'my_portfolio.json'
+PORTFOLIO_LOG_PATH = 'my_portfolio.jsonl'
+# 累積多少筆新增/刪除記錄後，把記錄壓縮成每支股票一行
+PORTFOLIO_COMPACT_THRESHOLD = 500
+
+def is_valid_stock(stock):
+    return isinstance(stock, dict) and 'Symbol' in stock and 'Name' in stock and 'Market' in stock and 'Transactions' in stock
+
+def replay_portfolio_log(lines):
+    """依序重播交易記錄，回傳 (投資組合, 新增/刪除記錄數, 無法套用的行號)
+
+    記錄有三種：
+    - {"op": "stock", "Symbol", "Name", "Market", "Transactions"}：壓縮後的整支股票
+    - {"op": "add", "Symbol", "Name", "Market", "Transaction"}：新增一筆交易
+    - {"op": "delete", "Symbol", "Index", "Transaction"}：刪除一筆交易
+    """
+    stocks = {}
+    event_count = 0
+    bad_lines = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            op = record['op']
+            if op == 'stock':
+                stock = {key: record[key] for key in ('Symbol', 'Name', 'Market', 'Transactions')}
+                stocks[stock['Symbol']] = stock
+                continue
+
+            event_count += 1
+            symbol = record['Symbol']
+            if op == 'add':
+                stock = stocks.get(symbol)
+                if stock is None:
+                    stock = stocks[symbol] = {'Symbol': symbol, 'Name': record['Name'], 'Market': record['Market'], 'Transactions': []}
+                stock['Transactions'].append(record['Transaction'])
+            elif op == 'delete':
+                transactions = stocks[symbol]['Transactions']
+                index = record['Index']
+                if not (0 <= index < len(transactions) and transactions[index] == record['Transaction']):
+                    index = transactions.index(record['Transaction'])
+                del transactions[index]
+                if not transactions:
+                    del stocks[symbol]
+            else:
+                raise ValueError(op)
+        except (ValueError, KeyError, TypeError):
+            # 寫入中斷造成的殘缺行或無法對應的記錄，略過並回報
+            bad_lines.append(line_number)
+    return list(stocks.values()), event_count, bad_lines
+
+def _bad_lines_error(path, bad_lines):
+    return PortfolioFileError(f"投資組合記錄第 {', '.join(map(str, bad_lines))} 行無法解析，已略過", path, bad_lines)
+
+def read_portfolio_file(path):
+    """唯讀載入投資組合檔案 (.jsonl 交易記錄或舊版 .json)，回傳 (投資組合, PortfolioFileError 列表)
+
+    與 PortfolioLog.load() 不同，不會轉換舊版檔案，也不會壓縮交易記錄。
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.jsonl'):
+                portfolio, _, bad_lines = replay_portfolio_log(f)
+                return portfolio, [_bad_lines_error(path, bad_lines)] if bad_lines else []
+            portfolio = json.load(f)
+    except OSError as e:
+        return [], [PortfolioFileError(f"無法讀取投資組合文件: {e}", path)]
+    except json.JSONDecodeError:
+        return [], [PortfolioFileError('無法解析投資組合文件,使用空投資組合', path)]
+    if not (isinstance(portfolio, list) and all(is_valid_stock(stock) for stock in portfolio)):
+        return [], [PortfolioFileError('載入的投資組合格式不正確,使用空投資組合', path)]
+    return portfolio, []
+
+def _portfolio_stock_record(stock):
+    return {'op': 'stock', 'Symbol': stock['Symbol'], 'Name': stock['Name'], 'Market': stock['Market'], 'Transactions': stock['Transactions']}
+
+def _dump_line(record):
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+class PortfolioLog:
+    """只追加寫入的投資組合交易記錄
+
+    每次新增或刪除交易只在檔尾追加一行；累積 PORTFOLIO_COMPACT_THRESHOLD 筆後，
+    從檔案重播出目前的投資組合，寫入暫存檔再以 os.replace 原子地取代原檔。
+    """
+
+    def __init__(self, path=PORTFOLIO_LOG_PATH, legacy_path=PORTFOLIO_PATH, compact_threshold=PORTFOLIO_COMPACT_THRESHOLD):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.compact_threshold = compact_threshold
+        self.pending_events = 0
+        self.last_written_key = None
+        self._lock = threading.Lock()
+
+    def file_key(self):
+        """以 (修改時間, 檔案大小) 代表檔案目前的版本，檔案不存在時為 None"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        """回傳 (投資組合, PortfolioFileError 列表)；檔案有問題時仍盡量載入可用的部分"""
+        with self._lock, timed('portfolio.load'):
+            warnings = []
+            if not os.path.exists(self.path) and os.path.exists(self.legacy_path):
+                warnings.extend(self._migrate_legacy())
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    portfolio, self.pending_events, bad_lines = replay_portfolio_log(f)
+            except FileNotFoundError:
+                return [], warnings
+            if bad_lines:
+                warnings.append(_bad_lines_error(self.path, bad_lines))
+            if self.pending_events >= self.compact_threshold:
+                self._write_snapshot(portfolio)
+            return portfolio, warnings
+
+    def append(self, records):
+        with self._lock, timed('portfolio.append'):
+            # 上次寫入若中斷在行中間，先補上換行，避免新記錄接在殘缺行後面
+            prefix = '\n' if self._ends_with_partial_line() else ''
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(prefix + ''.join(_dump_line(record) for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending_events += len(records)
+            if self.pending_events >= self.compact_threshold:
+                self._compact()
+            self.last_written_key = self.file_key()
+
+    def _ends_with_partial_line(self):
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b'\n'
+        except OSError:
+            return False
+
+    def add_transaction(self, stock, transaction):
+        self.append([{'op': 'add', 'Symbol': stock['Symbol'], 'Name': stock['Name'], 'Market': stock['Market'], 'Transaction': transaction}])
+
+    def delete_transaction(self, symbol, index, transaction):
+        self.append([{'op': 'delete', 'Symbol': symbol, 'Index': index, 'Transaction': transaction}])
+
+    def compact(self):
+        with self._lock:
+            self._compact()
+
+    def write(self, portfolio):
+        """以整份投資組合覆寫交易記錄 (每支股票一行)"""
+        with self._lock:
+            self._write_snapshot(portfolio)
+
+    def _compact(self):
+        # 以檔案內容為準重播，避免覆蓋其他 session 剛追加的記錄
+        with open(self.path, 'r', encoding='utf-8') as f:
+            portfolio, _, _ = replay_portfolio_log(f)
+        self._write_snapshot(portfolio)
+
+    @timed('portfolio.write')
+    def _write_snapshot(self, portfolio):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(_dump_line(_portfolio_stock_record(stock)) for stock in portfolio))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.pending_events = 0
+        self.last_written_key = self.file_key()
+
+    def _migrate_legacy(self):
+        """一次性把舊版 my_portfolio.json 轉成交易記錄，原檔改名為 .bak 保留"""
+        portfolio, errors = read_portfolio_file(self.legacy_path)
+        if errors:
+            return errors
+        self._write_snapshot(portfolio)
+        os.replace(self.legacy_path, f"{self.legacy_path}.bak")
+        return []
+
+class PortfolioWatcher(FileSystemEventHandler):
+    """以 watchdog 監看投資組合檔案
+
+    檔案被其他程式 (或手動編輯) 修改時遞增 generation，讓各 session 的快取失效；
+    本程式自己寫入造成的事件會被忽略。沒有安裝 watchdog 時 generation 永遠為 0，
+    只靠檔案的修改時間與大小判斷。
+    """
+
+    def __init__(self, log):
+        self.log = log
+        self.generation = 0
+        self.observer = None
+        if Observer is None:
+            return
+        directory = os.path.dirname(os.path.abspath(log.path))
+        self.observer = Observer()
+        self.observer.schedule(self, directory, recursive=False)
+        self.observer.daemon = True
+        self.observer.start()
+
+    def on_any_event(self, event):
+        # 只讀取檔案也會產生 opened/closed 事件，這些不代表內容變動
+        if event.event_type not in ('created', 'modified', 'moved', 'deleted', 'closed'):
+            return
+        paths = {getattr(event, 'src_path', ''), getattr(event, 'dest_path', '')}
+        if os.path.abspath(self.log.path) not in {os.path.abspath(path) for path in paths if path}:
+            return
+        # 等本程式進行中的寫入完成，才能正確判斷事件是不是自己造成的
+        with self.log._lock:
+            if self.log.file_key() != self.log.last_written_key:
+                self.generation += 1
@@ -0,0 +1,235 @@
+"""股票代號查詢與本地代號目錄"""
+
+import bisect
+import difflib
+import io
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+
+from .cache import LRUCache
+from .errors import SymbolLookupError, SymbolNotFound
+from .instrumentation import cache_lookup
+from .fx import FX_REQUEST_TIMEOUT
+from .markets import register_exchanges, to_yf_ticker
+from .providers import default_provider
+
+# 股票資訊快取：查到的名稱與市場保留一天，查無此代號的結果保留 10 分鐘
+STOCK_INFO_TTL = 24 * 60 * 60
+STOCK_INFO_NOT_FOUND_TTL = 10 * 60
+STOCK_INFO_CACHE_SIZE = 2000
+
+def _is_not_found(error):
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) == 404 or '404' in str(error)
+
+# 不在代號目錄中的代號依序嘗試的 (市場, 交易所)
+STOCK_INFO_CANDIDATES = [('台股', 'TWSE'), ('台股', 'TPEx'), ('美股', None)]
+
+def _lookup_stock_info(provider, symbol, market, exchange=None):
+    ticker = to_yf_ticker(symbol, market, exchange)
+    info = provider.stock_info(ticker)
+    if info and 'longName' in info:
+        # 查得到名稱但暫時沒有報價時價格為 None，名稱與市場照常回傳
+        current_price = provider.quotes([ticker]).get(ticker)
+        return info['longName'], market, None if current_price is None else float(current_price), exchange
+    return None
+
+class StockInfoResolver:
+    """同時以台股 (上市、上櫃) 與美股查詢股票代號，採用最先查到的結果
+
+    查到的 (名稱, 市場) 與查無此代號的結果都會快取，打錯的代號不會每次都重新連網。
+    """
+
+    def __init__(self, price_lookup, ttl=STOCK_INFO_TTL, not_found_ttl=STOCK_INFO_NOT_FOUND_TTL, max_size=STOCK_INFO_CACHE_SIZE, provider=None):
+        # price_lookup(symbol, market) 回傳目前價格，名稱與市場命中快取時用來補上價格
+        self.price_lookup = price_lookup
+        self.provider = provider or default_provider()
+        self.ttl = ttl
+        self.not_found_ttl = not_found_ttl
+        self._cache = LRUCache(max_size)
+        self._executor = ThreadPoolExecutor(max_workers=4)
+
+    def resolve(self, symbol):
+        """回傳 (名稱, 市場, 目前價格)，暫時取不到價格時價格為 None；查無此代號時拋出 SymbolNotFound，其他錯誤拋出 SymbolLookupError"""
+        entry = self._cache.get(symbol)
+        cache_lookup('stock_info', entry is not None and time.time() < entry[1])
+        if entry is not None and time.time() < entry[1]:
+            if entry[0] is None:
+                raise SymbolNotFound(symbol)
+            name, market = entry[0]
+            return name, market, self.price_lookup(symbol, market)
+
+        futures = [self._executor.submit(_lookup_stock_info, self.provider, symbol, market, exchange) for market, exchange in STOCK_INFO_CANDIDATES]
+        errors = []
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append(e)
+                continue
+            if result is not None:
+                name, market, price, exchange = result
+                if exchange:
+                    register_exchanges({symbol: exchange})
+                self._cache.set(symbol, ((name, market), time.time() + self.ttl))
+                return name, market, price
+
+        if errors and not all(_is_not_found(e) for e in errors):
+            error = errors[0]
+            kind = '網路錯誤' if isinstance(error, requests.exceptions.HTTPError) else '未知錯誤'
+            raise SymbolLookupError(symbol, f"{kind}：{error}") from error
+        self._cache.set(symbol, (None, time.time() + self.not_found_ttl))
+        raise SymbolNotFound(symbol)
+
+# 股票代號目錄：隨程式附帶的清單，以及使用者從交易所更新下來的完整清單 (優先使用)
+SYMBOL_DIRECTORY_BUNDLED_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'symbols.csv')
+SYMBOL_DIRECTORY_PATH = os.path.join('.cache', 'symbols.csv')
+SYMBOL_DIRECTORY_SOURCES = {
+    'TWSE': "https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL",
+    'TPEx': "https://www.tpex.org.tw/openapi/v1/tpex_mainboard_daily_close_quotes",
+    'NASDAQ': "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt",
+    'OTHER': "https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt",
+}
+SYMBOL_SEARCH_LIMIT = 8
+# 模糊比對時，代號與名稱各依共同二字元組數量挑出的候選筆數 (再以 difflib 排序)，
+# 以及忽略的常見二字元組 (出現在超過這個比例的資料中，對挑選候選沒有幫助)
+SYMBOL_FUZZY_CANDIDATES = 32
+SYMBOL_FUZZY_COMMON_SHARE = 0.02
+
+def _bigrams(text):
+    padded = f' {text} '
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+def _bigram_index(texts):
+    postings = defaultdict(list)
+    for index, text in enumerate(texts):
+        for gram in _bigrams(text):
+            postings[gram].append(index)
+    common = max(SYMBOL_FUZZY_CANDIDATES, len(texts) * SYMBOL_FUZZY_COMMON_SHARE)
+    return {gram: indexes for gram, indexes in postings.items() if len(indexes) <= common}
+
+def _close_matches(query, texts, index, limit, cutoff):
+    """與 difflib.get_close_matches 相同的排序與門檻，但只比對共同二字元組最多的候選"""
+    if limit <= 0:
+        return []
+    shared = Counter()
+    for gram in _bigrams(query):
+        shared.update(index.get(gram, ()))
+    scored = []
+    for position, _ in shared.most_common(SYMBOL_FUZZY_CANDIDATES):
+        matcher = difflib.SequenceMatcher(None, texts[position], query)
+        if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+            ratio = matcher.ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, texts[position], position))
+    return [position for _, _, position in sorted(scored, reverse=True)[:limit]]
+
+class SymbolDirectory:
+    """台股 (上市、上櫃) 與美股代號的本地索引
+
+    代號與名稱各有一份排序好的清單，以 bisect 做前綴搜尋；前綴找不到時才模糊比對：
+    先以二字元組索引挑出少量候選，再用 difflib 排序，不必掃過整份清單。
+    """
+
+    def __init__(self, entries):
+        entries = entries.drop_duplicates('Code').reset_index(drop=True)
+        self.entries = entries
+        self._by_code = {code: (name, market) for code, name, market in zip(entries['Code'], entries['Name'], entries['Market'])}
+        if 'Exchange' in entries:
+            # 上櫃股票的 Yahoo 代號是 .TWO，登記後報價與歷史資料都會使用正確的代號
+            taiwan = entries[entries['Market'] == '台股']
+            register_exchanges(dict(zip(taiwan['Code'], taiwan['Exchange'])))
+        self._codes = sorted(self._by_code)
+        self._names = sorted((name.casefold(), code) for code, name in zip(entries['Code'], entries['Name']))
+        self._name_codes = dict(self._names)
+        self._name_keys = list(self._name_codes)
+        self._code_grams = _bigram_index(self._codes)
+        self._name_grams = _bigram_index(self._name_keys)
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path, dtype=str, keep_default_na=False))
+
+    def __len__(self):
+        return len(self._codes)
+
+    def lookup(self, code):
+        """回傳 (名稱, 市場)，找不到時回傳 None"""
+        return self._by_code.get(code.upper())
+
+    def search(self, query, limit=SYMBOL_SEARCH_LIMIT):
+        """依代號前綴、名稱前綴、模糊比對的順序回傳最多 limit 筆 (代號, 名稱, 市場)"""
+        query = query.strip()
+        if not query:
+            return []
+
+        codes = []
+        code_query = query.upper()
+        start = bisect.bisect_left(self._codes, code_query)
+        for code in self._codes[start:start + limit]:
+            if not code.startswith(code_query):
+                break
+            codes.append(code)
+
+        name_query = query.casefold()
+        start = bisect.bisect_left(self._names, (name_query, ''))
+        for name, code in self._names[start:start + limit]:
+            if len(codes) >= limit or not name.startswith(name_query):
+                break
+            if code not in codes:
+                codes.append(code)
+
+        if not codes:
+            codes = [self._codes[i] for i in _close_matches(code_query, self._codes, self._code_grams, limit, 0.6)]
+            names = _close_matches(name_query, self._name_keys, self._name_grams, limit - len(codes), 0.5)
+            codes += [self._name_codes[self._name_keys[i]] for i in names]
+
+        return [(code, *self._by_code[code]) for code in dict.fromkeys(codes)][:limit]
+
+def load_symbol_directory():
+    """讀取使用者更新過的完整代號清單，沒有時使用隨程式附帶的清單；都無法讀取時回傳空目錄"""
+    path = SYMBOL_DIRECTORY_PATH if os.path.exists(SYMBOL_DIRECTORY_PATH) else SYMBOL_DIRECTORY_BUNDLED_PATH
+    try:
+        return SymbolDirectory.from_csv(path)
+    except (OSError, ValueError, KeyError):
+        return SymbolDirectory(pd.DataFrame(columns=['Code', 'Name', 'Market', 'Exchange']))
+
+def _fetch_symbol_sources(timeout=FX_REQUEST_TIMEOUT * 6):
+    frames = []
+
+    response = requests.get(SYMBOL_DIRECTORY_SOURCES['TWSE'], timeout=timeout)
+    response.raise_for_status()
+    frames.append(pd.DataFrame([(row['Code'], row['Name'], '台股', 'TWSE') for row in response.json()], columns=['Code', 'Name', 'Market', 'Exchange']))
+
+    response = requests.get(SYMBOL_DIRECTORY_SOURCES['TPEx'], timeout=timeout)
+    response.raise_for_status()
+    frames.append(pd.DataFrame([(row['SecuritiesCompanyCode'], row['CompanyName'], '台股', 'TPEx') for row in response.json()], columns=['Code', 'Name', 'Market', 'Exchange']))
+
+    for source, symbol_column in (('NASDAQ', 'Symbol'), ('OTHER', 'ACT Symbol')):
+        response = requests.get(SYMBOL_DIRECTORY_SOURCES[source], timeout=timeout)
+        response.raise_for_status()
+        listed = pd.read_csv(io.StringIO(response.text), sep='|', dtype=str, keep_default_na=False)
+        listed = listed[(listed['Test Issue'] == 'N') & ~listed[symbol_column].str.contains(r'\$', regex=True)]
+        frames.append(pd.DataFrame({
+            # Yahoo Finance 以 "-" 表示股票類別，例如 BRK.B → BRK-B
+            'Code': listed[symbol_column].str.replace('.', '-', regex=False),
+            'Name': listed['Security Name'],
+            'Market': '美股',
+            'Exchange': 'US',
+        }))
+
+    return pd.concat(frames, ignore_index=True)
+
+def refresh_symbol_directory(path=SYMBOL_DIRECTORY_PATH):
+    """從證交所、櫃買中心與 NASDAQ Trader 下載完整代號清單，回傳筆數"""
+    entries = _fetch_symbol_sources()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    entries.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return len(entries)